@@ -5,6 +5,7 @@ import tempfile
 import requests
 import uuid
 from openai import OpenAI
+import httpx
 import cv2
 import base64
 import time
@@ -12,15 +13,28 @@ import concurrent.futures
 from dotenv import load_dotenv
 import numpy as np
 from datetime import datetime
-import whisper
 import json
 import queue
 import threading
 import re
 import subprocess
 import warnings
+import hashlib
+import shutil
+import atexit
+import signal
+import sys
+import multiprocessing
+import bisect
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+from collections import OrderedDict
 import firebase_admin
 from firebase_admin import credentials, firestore
+from vad import detect_speech_regions
+from whisper_backends import (
+    WHISPER_BACKEND, WHISPER_COMPUTE_TYPE, WHISPER_MODEL_SIZE, WHISPER_MODEL_SIZES, create_whisper_backend
+)
 
 
 # Suppress Whisper warnings
@@ -41,51 +55,490 @@ api_key = os.getenv("GROQ_API_KEY")
 if not api_key:
     print("Warning: GROQ_API_KEY not found in environment variables")
 
+# Shared Groq client: one connection pool for every agent in the process
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "32"))
+GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", "16"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60"))  # seconds
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "10"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+
+def create_groq_client(base_url=GROQ_BASE_URL):
+    """Build an OpenAI-compatible Groq client over a keep-alive HTTP connection pool"""
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+    )
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+# Created on first use so the module still imports without GROQ_API_KEY
+_groq_client = None
+_groq_client_lock = threading.Lock()
+
+def get_groq_client():
+    """Return the shared Groq client, creating it on first use"""
+    global _groq_client
+    with _groq_client_lock:
+        if _groq_client is None:
+            _groq_client = create_groq_client()
+        return _groq_client
+
+# Whisper configuration
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "false").lower() == "true"
+
+class WhisperModelRegistry:
+    """Process-wide Whisper model, loaded once and shared by every analysis"""
+    def __init__(self, model_size="tiny"):
+        if model_size not in WHISPER_MODEL_SIZES:
+            raise ValueError(f"Unsupported Whisper model size: {model_size} (expected one of {WHISPER_MODEL_SIZES})")
+        self.model_size = model_size
+        self.backend = WHISPER_BACKEND
+        self._model = None
+        self._load_lock = threading.Lock()
+        # openai-whisper installs kv-cache hooks on the model during decoding,
+        # so transcriptions on the shared instance must not overlap.
+        self._inference_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_time = None
+        self.transcription_count = 0
+        self.total_transcription_time = 0.0
+
+    def is_loaded(self):
+        return self._model is not None
+
+    def get_model(self):
+        """Return the resident model, loading it on first use"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    print(f"⏳ Loading Whisper model '{self.model_size}' ({self.backend})...")
+                    load_start = time.time()
+                    self._model = create_whisper_backend(self.model_size, self.backend)
+                    self.load_time = time.time() - load_start
+                    print(f"✅ Whisper model '{self.model_size}' loaded in {self.load_time:.2f} seconds")
+        return self._model
+
+    def transcribe(self, audio, **kwargs):
+        """Transcribe on the shared model; returns (result, transcription_seconds)"""
+        model = self.get_model()
+        with self._inference_lock:
+            transcribe_start = time.time()
+            result = model.transcribe(audio, **kwargs)
+            elapsed = time.time() - transcribe_start
+        with self._stats_lock:
+            self.transcription_count += 1
+            self.total_transcription_time += elapsed
+        return result, elapsed
+
+    def stats(self):
+        with self._stats_lock:
+            count = self.transcription_count
+            total = self.total_transcription_time
+        return {
+            "model_size": self.model_size,
+            "backend": self.backend,
+            "loaded": self.is_loaded(),
+            "load_time": self.load_time,
+            "transcription_count": count,
+            "total_transcription_time": total,
+            "avg_transcription_time": total / count if count else None
+        }
+
+whisper_registry = WhisperModelRegistry(WHISPER_MODEL_SIZE)
+
+def _result_to_timestamps(result, has_word_timestamps=True, offset=0.0):
+    """Flatten a Whisper result into [{text, start, end}], shifted by ``offset`` seconds"""
+    timestamps = []
+    words = result.get("words") or [
+        word for segment in result.get("segments", []) for word in segment.get("words", [])
+    ]
+    if has_word_timestamps and words:
+        for word in words:
+            timestamps.append({
+                "text": word["word"],
+                "start": word["start"] + offset,
+                "end": word["end"] + offset
+            })
+    elif "segments" in result:
+        for segment in result["segments"]:
+            timestamps.append({
+                "text": segment["text"],
+                "start": segment["start"] + offset,
+                "end": segment["end"] + offset
+            })
+    return timestamps
+
+# Chunked transcription configuration. With more than one worker, long audio is
+# trimmed by an energy VAD, cut into overlapping windows and transcribed in parallel.
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "0"))
+TRANSCRIBE_WINDOW_SECONDS = float(os.getenv("TRANSCRIBE_WINDOW_SECONDS", "60"))
+TRANSCRIBE_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "2"))
+
+def plan_transcription_windows(regions, sample_rate=16000):
+    """Group speech regions into windows of at most TRANSCRIBE_WINDOW_SECONDS.
+
+    Returns [(start, end, keep_start, keep_end)] in samples. Long regions are
+    split with TRANSCRIBE_OVERLAP_SECONDS of overlap; each window keeps only the
+    words starting inside [keep_start, keep_end), which meet at the middle of
+    every overlap so nothing is transcribed twice or dropped.
+    """
+    window = int(TRANSCRIBE_WINDOW_SECONDS * sample_rate)
+    overlap = min(int(TRANSCRIBE_OVERLAP_SECONDS * sample_rate), window // 2)
+    
+    spans = []
+    for start, end in regions:
+        if spans and end - spans[-1][0] <= window:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+    
+    windows = []
+    for start, end in spans:
+        piece_start = start
+        while True:
+            piece_end = min(piece_start + window, end)
+            keep_start = start if piece_start == start else piece_start + overlap // 2
+            keep_end = end if piece_end == end else piece_end - overlap // 2
+            windows.append((piece_start, piece_end, keep_start, keep_end))
+            if piece_end == end:
+                break
+            piece_start = piece_end - overlap
+    return windows
+
+_worker_model = None
+
+def _init_transcription_worker(model_size, threads):
+    """Load a private Whisper model in each transcription pool process"""
+    global _worker_model
+    if WHISPER_BACKEND == "openai":
+        import torch
+        torch.set_num_threads(threads)
+    _worker_model = create_whisper_backend(model_size, WHISPER_BACKEND, cpu_threads=threads)
+
+def _transcribe_window(args):
+    audio_window, offset = args
+    try:
+        result = _worker_model.transcribe(audio_window, language="en", word_timestamps=True)
+        return _result_to_timestamps(result, True, offset)
+    except Exception:
+        result = _worker_model.transcribe(audio_window, language="en")
+        return _result_to_timestamps(result, False, offset)
+
+# Analysis cache configuration
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "andy_analysis_cache"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Bump after prompt or model changes so old results are not served
+ANALYSIS_CACHE_VERSION = os.getenv("ANALYSIS_CACHE_VERSION", "1")
+ANALYSIS_CACHE_STAGES = (
+    "transcript", "chunk_insights", "transcript_analyses", "speaker_quotes",
+    "content_segments", "visual_examples", "explanation"
+)
+
+def cache_stage_settings(stage):
+    """Settings a cached stage's result depends on, directly or through its inputs"""
+    settings = {"whisper_model": WHISPER_MODEL_SIZE, "whisper_backend": WHISPER_BACKEND}
+    if WHISPER_BACKEND == "ctranslate2":
+        settings["whisper_compute_type"] = WHISPER_COMPUTE_TYPE
+    if stage in ("chunk_insights", "transcript_analyses", "speaker_quotes", "explanation"):
+        settings["transcript_extraction"] = TRANSCRIPT_EXTRACTION_MODE
+    if stage in ("visual_examples", "explanation"):
+        settings["frame_selection"] = FRAME_SELECTION_MODE
+        settings["frame_alignment"] = FRAME_ALIGNMENT_MODE
+    return settings
+
+class AnalysisCache:
+    """Content-addressed on-disk cache of per-stage video analysis results.
+
+    Each entry is a directory named after the cache key holding one JSON file
+    per stage, named after the stage and a hash of the settings it depends on
+    (see cache_stage_settings), so changing e.g. the Whisper model or the
+    extraction mode misses instead of serving results computed under the old
+    settings. Entries are evicted least-recently-used once the total size
+    exceeds ``max_bytes``.
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self.total_bytes = 0
+        self.hits = {stage: 0 for stage in ANALYSIS_CACHE_STAGES}
+        self.misses = {stage: 0 for stage in ANALYSIS_CACHE_STAGES}
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(file_id, content_hash):
+        return f"v{ANALYSIS_CACHE_VERSION}-{file_id}-{content_hash}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _stage_path(self, key, stage):
+        settings = json.dumps(cache_stage_settings(stage), sort_keys=True).encode("utf-8")
+        fingerprint = hashlib.sha256(settings).hexdigest()[:12]
+        return os.path.join(self._entry_dir(key), f"{stage}-{fingerprint}.json")
+
+    def _load_index(self):
+        """Rebuild the LRU order from what is already on disk"""
+        found = []
+        for key in os.listdir(self.root):
+            entry_dir = self._entry_dir(key)
+            if not os.path.isdir(entry_dir):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+            found.append((os.path.getmtime(entry_dir), key, size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def get(self, key, stage):
+        """Return (hit, value) for a stage of a cache entry"""
+        path = self._stage_path(key, stage)
+        with self.lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)["value"]
+            except (OSError, ValueError, KeyError):
+                self.misses[stage] += 1
+                return False, None
+            self.hits[stage] += 1
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            os.utime(self._entry_dir(key))
+        return True, value
+
+    def put(self, key, stage, value):
+        path = self._stage_path(key, stage)
+        data = json.dumps({"stage": stage, "value": value}).encode("utf-8")
+        with self.lock:
+            os.makedirs(self._entry_dir(key), exist_ok=True)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self.entries[key] = self.entries.get(key, 0) - previous_size + len(data)
+            self.entries.move_to_end(key)
+            self.total_bytes += len(data) - previous_size
+            self._evict(keep=key)
+
+    def _evict(self, keep):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            if oldest == keep:
+                break
+            size = self.entries.pop(oldest)
+            self.total_bytes -= size
+            self.evictions += 1
+            shutil.rmtree(self._entry_dir(oldest), ignore_errors=True)
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "entries": len(self.entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+                "evictions": self.evictions,
+                "stages": {stage: {"hits": self.hits[stage], "misses": self.misses[stage]}
+                           for stage in ANALYSIS_CACHE_STAGES}
+            }
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_BYTES) if ANALYSIS_CACHE_ENABLED else None
+
+def parse_json_object(text):
+    """Parse a JSON object from an LLM response, tolerating code fences and surrounding prose"""
+    if not text:
+        return None
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text)
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            parsed = json.loads(match.group(0))
+        except ValueError:
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+# Transcript extraction modes: "separate" makes one concept call and one quote
+# call per chunk; "combined" gets concepts, quotes and examples as one JSON object.
+TRANSCRIPT_EXTRACTION_MODES = ("separate", "combined")
+TRANSCRIPT_EXTRACTION_MODE = os.getenv("TRANSCRIPT_EXTRACTION_MODE", "separate")
+
+# Job checkpoint configuration
+JOB_CHECKPOINT_DIR = os.getenv("JOB_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "andy_job_checkpoints"))
+JOB_CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("JOB_CHECKPOINT_MAX_AGE_HOURS", "48"))
+JOB_CHECKPOINT_PRUNE_INTERVAL = 3600  # seconds between prunes in a running server
+
+class JobCheckpoint:
+    """Local per-job store of completed pipeline stages (and the downloaded video).
+
+    A failed job keeps its checkpoint; rerunning the same job ID resumes from
+    the stages already saved. The checkpoint is removed once the job succeeds.
+    """
+    def __init__(self, job_id, root=JOB_CHECKPOINT_DIR):
+        self.job_id = job_id
+        self.dir = os.path.join(root, job_id)
+        self.video_path = os.path.join(self.dir, "video.mp4")
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _stage_path(self, stage):
+        return os.path.join(self.dir, f"{stage}.json")
+
+    def get(self, stage):
+        """Return (hit, value) for a saved stage"""
+        try:
+            with open(self._stage_path(stage), "r", encoding="utf-8") as f:
+                return True, json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return False, None
+
+    def put(self, stage, value):
+        path = self._stage_path(stage)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"stage": stage, "value": value}, f)
+        os.replace(temp_path, path)
+
+    def completed_stages(self):
+        return sorted(name[:-5] for name in os.listdir(self.dir) if name.endswith(".json") and name != "meta.json")
+
+    def has_video(self):
+        hit, meta = self.get("meta")
+        return hit and os.path.exists(self.video_path) and os.path.getsize(self.video_path) == meta.get("size")
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+_last_checkpoint_prune = 0.0
+_checkpoint_prune_lock = threading.Lock()
+
+def prune_job_checkpoints(root=JOB_CHECKPOINT_DIR, max_age_hours=JOB_CHECKPOINT_MAX_AGE_HOURS):
+    """Remove checkpoints of jobs that were never retried"""
+    global _last_checkpoint_prune
+    _last_checkpoint_prune = time.time()
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for job_id in os.listdir(root):
+        job_dir = os.path.join(root, job_id)
+        if os.path.isdir(job_dir) and os.path.getmtime(job_dir) < cutoff:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+def maybe_prune_job_checkpoints():
+    """Prune at most once per JOB_CHECKPOINT_PRUNE_INTERVAL; called by the job workers"""
+    with _checkpoint_prune_lock:
+        if time.time() - _last_checkpoint_prune < JOB_CHECKPOINT_PRUNE_INTERVAL:
+            return
+        try:
+            prune_job_checkpoints()
+        except OSError as e:
+            print(f"⚠️ Checkpoint prune failed: {e}")
+
+prune_job_checkpoints()
+
 # Multi-agent configuration
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+# Process-wide cap on in-flight LLM calls, shared by every agent, job and backfill worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+llm_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class AgentError(RuntimeError):
+    """An agent gave up on an LLM call after all its retries"""
+
 class Agent:
     """Base agent class for educational content analysis"""
-    def __init__(self, name, model_name, max_tokens=1000):
+    def __init__(self, name, model_name, max_tokens=1000, max_input_tokens=1250,
+                 chunk_tokens=750, max_concurrency=AGENT_MAX_CONCURRENCY, client=None):
         self.name = name
         self.model_name = model_name
         self.max_tokens = max_tokens
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.groq.com/openai/v1"
-        )
+        self.max_input_tokens = max_input_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        # Caps in-flight LLM calls for this agent across all concurrent callers
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.client = client or get_groq_client()
     
     def process(self, content, prompt_template, max_retries=3):
-        """Process content with retry logic and token management"""
-        if isinstance(content, str) and len(content) > 5000:
+        """Process content with retry logic and token management.
+
+        Content over ``max_input_tokens`` is split on sentence boundaries and
+        the pieces are sent concurrently; results are combined in order.
+        """
+        if isinstance(content, str) and estimate_tokens(content) > self.max_input_tokens:
             content_chunks = self._split_content(content)
-            results = []
-            for chunk in content_chunks:
-                chunk_result = self._process_with_retry(chunk, prompt_template, max_retries)
-                if chunk_result:
-                    results.append(chunk_result)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(content_chunks), self.max_concurrency)) as executor:
+                chunk_results = executor.map(
+                    lambda chunk: self._process_with_retry(chunk, prompt_template, max_retries),
+                    content_chunks
+                )
+                results = [chunk_result for chunk_result in chunk_results if chunk_result]
             return self._combine_results(results)
         else:
             return self._process_with_retry(content, prompt_template, max_retries)
     
     def _process_with_retry(self, content, prompt_template, max_retries):
-        """Process with retry logic for API failures"""
+        """Process with retry logic for API failures.
+
+        Raises AgentError after the last attempt so the pipeline stage fails
+        (and is not checkpointed or cached) instead of storing error text.
+        """
         for attempt in range(max_retries):
             try:
                 prompt = prompt_template.format(content=content)
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=self.max_tokens
-                )
+                with self.semaphore, llm_semaphore:
+                    response = self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=self.max_tokens
+                    )
                 return response.choices[0].message.content
             except Exception as e:
                 print(f"⚠️ {self.name} error (attempt {attempt+1}/{max_retries}): {str(e)}")
                 if attempt == max_retries - 1:
-                    return f"Error processing content: {str(e)}"
+                    raise AgentError(f"{self.name} failed after {max_retries} attempts: {e}") from e
                 time.sleep(1)
     
-    def _split_content(self, content, chunk_size=3000):
-        """Split text content into manageable chunks"""
-        return [content[i:i+chunk_size] for i in range(0, len(content), chunk_size)]
+    def _split_content(self, content, chunk_tokens=None):
+        """Split text into sentence-aligned pieces of about ``chunk_tokens`` tokens"""
+        chunk_chars = (chunk_tokens or self.chunk_tokens) * CHARS_PER_TOKEN
+        chunks = []
+        current_parts = []
+        current_length = 0
+        for sentence in SENTENCE_PATTERN.findall(content):
+            # A single overlong sentence is cut at the budget
+            pieces = [sentence[i:i+chunk_chars] for i in range(0, len(sentence), chunk_chars)]
+            for piece in pieces:
+                if current_parts and current_length + len(piece) > chunk_chars:
+                    chunks.append("".join(current_parts))
+                    current_parts = []
+                    current_length = 0
+                current_parts.append(piece)
+                current_length += len(piece)
+        if current_parts:
+            chunks.append("".join(current_parts))
+        return chunks
     
     def _combine_results(self, results):
         """Combine results from multiple chunks"""
@@ -167,6 +620,46 @@ class TranscriptAgent(Agent):
         )
         return self.process(transcript_chunk, prompt_template)
 
+    def extract_chunk_insights(self, transcript_chunk):
+        """Extract concepts, quotes and examples from a chunk in one call.
+
+        Returns a dict with ``concepts``, ``quotes`` and ``examples`` lists; if
+        the model does not return valid JSON its text is kept as a concept.
+        """
+        prompt_template = (
+            "Extract and EXPLAIN the educational content of this transcript chunk. "
+            "Return ONLY a JSON object with these keys:\n"
+            "\"concepts\": list of the specific concepts being taught, each with a one-sentence explanation\n"
+            "\"quotes\": list of 2-3 EXACT quotes where the speaker explains a key concept, gives an example "
+            "or makes an important statement (no paraphrasing, no surrounding quotation marks)\n"
+            "\"examples\": list of examples or analogies the speaker uses to explain concepts\n"
+            "IMPORTANT: Only include content explicitly present in the transcript. "
+            "Do NOT include generic examples or assume topics unless they are clearly discussed.\n"
+            "AVOID using special Unicode characters like arrows (→); use ASCII alternatives like '->' instead.\n\n"
+            "Transcript chunk:\n{content}"
+        )
+        response = self.process(transcript_chunk, prompt_template)
+        insights = parse_json_object(response)
+        if insights is None:
+            return {"concepts": [response] if response else [], "quotes": [], "examples": []}
+        return {key: [str(item) for item in insights.get(key) or []] for key in ("concepts", "quotes", "examples")}
+
+    @staticmethod
+    def format_insights(insights):
+        """Render chunk insights as the (analysis, quotes) text the summary agent expects.
+
+        Quotes are only returned separately; the summary adds them under its own
+        heading, so repeating them in the analysis would send each one twice.
+        """
+        sections = []
+        if insights["concepts"]:
+            sections.append("Concepts:\n" + "\n".join(f"- {c}" for c in insights["concepts"]))
+        if insights["examples"]:
+            sections.append("Examples:\n" + "\n".join(f"- {e}" for e in insights["examples"]))
+        analysis = "\n".join(sections)
+        quotes = "\n".join(f'"{q}"' for q in insights["quotes"])
+        return analysis, quotes
+
 class SummaryAgent(Agent):
     """Agent specialized in creating explanations focused on transcript concepts and quotes"""
     def create_explanation_report(self, transcript_analyses, transcript_quotes, visual_examples=None):
@@ -240,9 +733,281 @@ def validate_video_file(video_path):
         print(f"❌ Video validation failed: {e}")
         return False
 
-def extract_keyframes(video_path, max_frames=20, return_timestamps=True):
+# Frame extraction modes: "seek" jumps to each wanted frame with OpenCV, decoding
+# at most one GOP per frame. "sequential" reads the file in one forward pass and
+# "ffmpeg" lets ffmpeg's select filter pick the frames; both decode every frame up
+# to the last wanted one, so they only pay off for dense sampling on short videos.
+FRAME_EXTRACTION_MODES = ("seek", "sequential", "ffmpeg")
+FRAME_EXTRACTION_MODE = os.getenv("FRAME_EXTRACTION_MODE", "seek")
+FRAME_WIDTH = int(os.getenv("FRAME_WIDTH", "480"))
+FRAME_OUTPUT_FORMATS = {"jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY), "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY)}
+FRAME_OUTPUT_FORMAT = os.getenv("FRAME_OUTPUT_FORMAT", "jpeg")
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_QUALITY", "50"))  # applies to either output format
+FRAME_ENCODE_WORKERS = int(os.getenv("FRAME_ENCODE_WORKERS", "0"))  # 0 = encode in the extracting thread
+
+# Frame selection modes: "uniform" spreads frames evenly over the video, "scene"
+# samples the video and keeps frames where the picture actually changes.
+FRAME_SELECTION_MODES = ("uniform", "scene")
+FRAME_SELECTION_MODE = os.getenv("FRAME_SELECTION_MODE", "uniform")
+SCENE_SAMPLE_INTERVAL = float(os.getenv("SCENE_SAMPLE_INTERVAL", "1.0"))  # seconds between sampled frames
+SCENE_MAX_SAMPLES = int(os.getenv("SCENE_MAX_SAMPLES", "900"))
+SCENE_CHANGE_THRESHOLD = float(os.getenv("SCENE_CHANGE_THRESHOLD", "0.1"))
+SCENE_HASH_DISTANCE = int(os.getenv("SCENE_HASH_DISTANCE", "6"))  # max differing dHash bits for a duplicate
+SCENE_THUMB_SIZE = (64, 36)
+
+def _select_frame_ids(frame_count, max_frames):
+    """Pick evenly spread frame ids across 5 equal segments of the video"""
+    if frame_count <= max_frames:
+        return list(range(frame_count))
+    
+    segment_size = frame_count // 5
+    frames_per_segment = max_frames // 5
+    
+    frames_to_extract = []
+    for segment in range(5):
+        segment_start = segment * segment_size
+        segment_end = (segment + 1) * segment_size
+        if segment_end > segment_start:
+            segment_frames = np.linspace(segment_start, segment_end-1, frames_per_segment, dtype=int)
+            frames_to_extract.extend(int(f) for f in segment_frames)
+    
+    # Sorted and unique so both readers can walk the file forwards once
+    return sorted(set(frames_to_extract))[:max_frames]
+
+def _sample_frame_ids(frame_count, fps):
+    """Pick frame ids at a fixed time interval for scene-change scoring"""
+    step = max(1, int(round(fps * SCENE_SAMPLE_INTERVAL))) if fps > 0 else 1
+    if frame_count // step > SCENE_MAX_SAMPLES:
+        step = int(np.ceil(frame_count / SCENE_MAX_SAMPLES))
+    return list(range(0, frame_count, step))
+
+def _frame_thumbnail(frame):
+    """Small grayscale thumbnail used for change scores and perceptual hashes"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, SCENE_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+def _thumbnail_histogram(thumb, bins=32):
+    hist = np.bincount((thumb >> 3).ravel(), minlength=bins).astype(np.float32)
+    return hist / hist.sum()
+
+def _difference_hash(thumb):
+    """64-bit dHash of a thumbnail as a boolean array"""
+    small = cv2.resize(thumb, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+def _select_scene_changes(frame_reader, max_frames):
+    """Keep frames where the content changes, dropping perceptual near-duplicates.
+
+    Each sampled frame is scored against the previous sample by the larger of
+    the grayscale histogram distance and the mean absolute pixel difference of
+    their thumbnails (both in [0, 1]). Frames above SCENE_CHANGE_THRESHOLD are
+    candidates; only the best ``max_frames`` are held, already downscaled, so
+    nothing is JPEG/base64 encoded until the final set is known.
+    """
+    candidates = []
+    prev_thumb = None
+    prev_hist = None
+    sampled = 0
+    
+    for frame_id, frame in frame_reader:
+        sampled += 1
+        thumb = _frame_thumbnail(frame)
+        hist = _thumbnail_histogram(thumb)
+        if prev_thumb is None:
+            score = 1.0  # Always keep the opening frame
+        else:
+            hist_diff = 0.5 * float(np.abs(hist - prev_hist).sum())
+            pixel_diff = float(np.abs(thumb.astype(np.int16) - prev_thumb).mean()) / 255.0
+            score = max(hist_diff, pixel_diff)
+        prev_thumb = thumb.astype(np.int16)
+        prev_hist = hist
+        
+        if score < SCENE_CHANGE_THRESHOLD:
+            continue
+        
+        frame_hash = _difference_hash(thumb)
+        duplicate = next((c for c in candidates
+                          if np.count_nonzero(c["hash"] != frame_hash) <= SCENE_HASH_DISTANCE), None)
+        if duplicate is not None:
+            # Slide revisited: keep whichever occurrence changed more
+            if score > duplicate["score"]:
+                candidates.remove(duplicate)
+            else:
+                continue
+        
+        if frame.shape[1] > FRAME_WIDTH:
+            frame = cv2.resize(frame, _scaled_size(frame.shape[1], frame.shape[0]))
+        candidates.append({"id": frame_id, "frame": frame, "score": score, "hash": frame_hash})
+        if len(candidates) > max_frames:
+            candidates.remove(min(candidates, key=lambda c: c["score"]))
+    
+    print(f"🎬 Scene detection kept {len(candidates)} of {sampled} sampled frames")
+    return [(c["id"], c["frame"]) for c in sorted(candidates, key=lambda c: c["id"])]
+
+def _scaled_size(width, height, target_width=FRAME_WIDTH):
+    return target_width, int(height * (target_width / width))
+
+def _encode_frame(frame, width=FRAME_WIDTH, quality=FRAME_JPEG_QUALITY, output_format=FRAME_OUTPUT_FORMAT):
+    """Resize a BGR frame to the target width and return it as base64 JPEG or WebP"""
+    if frame.shape[1] != width:
+        frame = cv2.resize(frame, _scaled_size(frame.shape[1], frame.shape[0], width))
+    extension, quality_flag = FRAME_OUTPUT_FORMATS[output_format]
+    encode_param = [int(quality_flag), quality]
+    _, buffer = cv2.imencode(extension, frame, encode_param)
+    return base64.b64encode(buffer).decode("utf-8")
+
+def _encode_shared_frame(shm_name, shape, width, quality, output_format):
+    """Pool worker: resize and encode a frame read in place from shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # The parent owns and unlinks the block; stop this process's tracker from claiming it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        encoded = _encode_frame(frame, width, quality, output_format)
+        del frame
+        return encoded
+    finally:
+        shm.close()
+
+# Worker pools, forked once every worker function is defined and before torch
+# has run (the Whisper preload comes after) or any server thread starts. Each
+# Pool starts handler threads in this process, so the frame encode pool (CPU-bound
+# resize/encode kept off the GIL) is forked first, while no thread is running.
+# The transcription workers are forked next; they inherit only the frame pool's
+# handler threads, which they never use, and load their own model.
+frame_encode_pool = None
+if FRAME_ENCODE_WORKERS > 0:
+    frame_encode_pool = multiprocessing.get_context("fork").Pool(FRAME_ENCODE_WORKERS)
+    atexit.register(frame_encode_pool.terminate)
+
+transcription_pool = None
+if TRANSCRIBE_WORKERS > 1:
+    transcription_pool = multiprocessing.get_context("fork").Pool(
+        TRANSCRIBE_WORKERS,
+        initializer=_init_transcription_worker,
+        initargs=(WHISPER_MODEL_SIZE, max(1, (os.cpu_count() or 1) // TRANSCRIBE_WORKERS))
+    )
+    atexit.register(transcription_pool.terminate)
+
+if WHISPER_PRELOAD:
+    whisper_registry.get_model()
+
+class FrameEncoder:
+    """Encodes frames in order, inline or on the frame pool via shared-memory buffers"""
+    def __init__(self, width=FRAME_WIDTH, quality=FRAME_JPEG_QUALITY, output_format=FRAME_OUTPUT_FORMAT):
+        if output_format not in FRAME_OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported frame output format: {output_format}")
+        self.width = width
+        self.quality = quality
+        self.output_format = output_format
+        self.max_in_flight = max(1, FRAME_ENCODE_WORKERS * 2)
+        self.pending = []  # (async_result or encoded str, shared memory block or None)
+        self.results = []
+
+    def submit(self, frame):
+        if frame_encode_pool is None:
+            self.results.append(_encode_frame(frame, self.width, self.quality, self.output_format))
+            return
+        frame = np.ascontiguousarray(frame)
+        shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf)[:] = frame
+        async_result = frame_encode_pool.apply_async(
+            _encode_shared_frame, (shm.name, frame.shape, self.width, self.quality, self.output_format)
+        )
+        self.pending.append((async_result, shm))
+        # Bound shared memory use: wait for the oldest frame once enough are in flight
+        if len(self.pending) >= self.max_in_flight:
+            self._collect_oldest()
+
+    def _collect_oldest(self):
+        async_result, shm = self.pending.pop(0)
+        try:
+            self.results.append(async_result.get())
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def finish(self):
+        """Wait for outstanding frames and return the encoded strings in submission order"""
+        try:
+            while self.pending:
+                self._collect_oldest()
+        finally:
+            for _, shm in self.pending:
+                shm.close()
+                shm.unlink()
+            self.pending = []
+        return self.results
+
+def _read_frames_seek(video, frame_ids):
+    """Yield (frame_id, frame) by seeking to each wanted id"""
+    for frame_id in frame_ids:
+        video.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+        success, frame = video.read()
+        if success:
+            yield frame_id, frame
+
+def _read_frames_sequential(video, frame_ids):
+    """Yield (frame_id, frame) for the wanted ids in a single forward pass.
+
+    grab() still decodes every frame up to the last wanted id and only skips
+    the colour conversion for unwanted ones. No seeking is done.
+    """
+    wanted = set(frame_ids)
+    last_wanted = max(frame_ids)
+    position = 0
+    while position <= last_wanted:
+        if not video.grab():
+            break
+        if position in wanted:
+            success, frame = video.retrieve()
+            if success:
+                yield position, frame
+        position += 1
+
+def _read_frames_ffmpeg(video_path, frame_ids, width, height):
+    """Yield (frame_id, frame) using ffmpeg's select filter over a raw BGR pipe"""
+    out_width, out_height = _scaled_size(width, height)
+    step = frame_ids[1] - frame_ids[0] if len(frame_ids) > 1 else 0
+    if frame_ids[0] == 0 and step > 0 and frame_ids == list(range(0, frame_ids[-1] + 1, step)):
+        # Regular sampling (scene detection): one cheap modulo instead of hundreds of eq() terms
+        select_expr = f"not(mod(n\\,{step}))"
+    else:
+        select_expr = "+".join(f"eq(n\\,{frame_id})" for frame_id in frame_ids)
+    command = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", video_path,
+        "-an",
+        "-vf", f"select='{select_expr}',scale={out_width}:{out_height}",
+        "-vsync", "0",
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "pipe:1"
+    ]
+    frame_bytes = out_width * out_height * 3
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        # ffmpeg emits the selected frames in decode order, which matches sorted ids
+        for frame_id in frame_ids:
+            raw = process.stdout.read(frame_bytes)
+            if len(raw) < frame_bytes:
+                break
+            yield frame_id, np.frombuffer(raw, dtype=np.uint8).reshape((out_height, out_width, 3))
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+def extract_keyframes(video_path, max_frames=20, return_timestamps=True, mode=None, selection=None):
     """Extract a limited number of key frames from video with timestamps"""
-    print("⏳ Extracting key video frames...")
+    mode = mode or FRAME_EXTRACTION_MODE
+    selection = selection or FRAME_SELECTION_MODE
+    if mode not in FRAME_EXTRACTION_MODES:
+        raise ValueError(f"Unsupported frame extraction mode: {mode}")
+    if selection not in FRAME_SELECTION_MODES:
+        raise ValueError(f"Unsupported frame selection mode: {selection}")
+    print(f"⏳ Extracting key video frames ({mode}, {selection})...")
     
     video = cv2.VideoCapture(video_path)
     if not video.isOpened():
@@ -250,6 +1015,8 @@ def extract_keyframes(video_path, max_frames=20, return_timestamps=True):
     
     fps = video.get(cv2.CAP_PROP_FPS)
     frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
     duration = frame_count / fps if fps > 0 else 0
     
     print(f"📊 Video stats: {frame_count} frames, {fps:.2f} fps, {duration:.2f} seconds")
@@ -258,52 +1025,104 @@ def extract_keyframes(video_path, max_frames=20, return_timestamps=True):
     frame_timestamps = []
     frame_indices = []
     
-    if frame_count <= max_frames:
-        frames_to_extract = list(range(frame_count))
+    if selection == "scene":
+        frames_to_extract = _sample_frame_ids(frame_count, fps)
     else:
-        segment_size = frame_count // 5
-        frames_per_segment = max_frames // 5
-        
-        frames_to_extract = []
-        for segment in range(5):
-            segment_start = segment * segment_size
-            segment_end = (segment + 1) * segment_size
-            if segment_end > segment_start:
-                segment_frames = np.linspace(segment_start, segment_end-1, frames_per_segment, dtype=int)
-                frames_to_extract.extend(segment_frames)
-        
-        frames_to_extract = frames_to_extract[:max_frames]
+        frames_to_extract = _select_frame_ids(frame_count, max_frames)
     
-    for frame_id in frames_to_extract:
-        video.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
-        success, frame = video.read()
-        if not success:
-            continue
-            
-        timestamp = frame_id / fps if fps > 0 else 0
-        frame_timestamps.append(timestamp)
-        frame_indices.append(frame_id)
-        
-        width = 480
-        height = int(frame.shape[0] * (width / frame.shape[1]))
-        resized_frame = cv2.resize(frame, (width, height))
+    try:
+        if not frames_to_extract:
+            frame_reader = iter(())
+        elif mode == "ffmpeg":
+            video.release()
+            frame_reader = _read_frames_ffmpeg(video_path, frames_to_extract, width, height)
+        elif mode == "sequential":
+            frame_reader = _read_frames_sequential(video, frames_to_extract)
+        else:
+            frame_reader = _read_frames_seek(video, frames_to_extract)
         
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 50]
-        _, buffer = cv2.imencode(".jpg", resized_frame, encode_param)
+        if selection == "scene":
+            frame_reader = _select_scene_changes(frame_reader, max_frames)
         
-        base64Frames.append(base64.b64encode(buffer).decode("utf-8"))
+        encoder = FrameEncoder()
+        try:
+            for frame_id, frame in frame_reader:
+                timestamp = frame_id / fps if fps > 0 else 0
+                frame_timestamps.append(timestamp)
+                frame_indices.append(frame_id)
+                encoder.submit(frame)
+        finally:
+            base64Frames = encoder.finish()
+    finally:
+        video.release()
     
-    video.release()
     print(f"✅ Extracted {len(base64Frames)} key frames")
     
     if return_timestamps:
         return base64Frames, frame_timestamps, frame_indices
     return base64Frames
 
-def extract_audio(video_path, output_path="temp_audio.wav"):
-    """Extract audio from video using ffmpeg"""
+# Audio decode modes: "memory" reads 16 kHz mono float32 PCM from ffmpeg's stdout
+# straight into NumPy, "file" writes a per-call temporary WAV for Whisper to read.
+AUDIO_DECODE_MODES = ("memory", "file")
+AUDIO_DECODE_MODE = os.getenv("AUDIO_DECODE_MODE", "memory")
+AUDIO_SAMPLE_RATE = 16000
+
+def _pcm_decode_command(source):
+    return [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", source,
+        "-vn",
+        "-ac", "1",
+        "-ar", str(AUDIO_SAMPLE_RATE),
+        "-f", "f32le",
+        "-acodec", "pcm_f32le",
+        "pipe:1"
+    ]
+
+def _read_pcm_stream(stream, read_size=1 << 20):
+    """Read float32 PCM from a pipe into a writable NumPy array without an extra copy"""
+    buffer = bytearray()
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        buffer.extend(data)
+    del buffer[len(buffer) - len(buffer) % 4:]
+    return np.frombuffer(buffer, dtype=np.float32)
+
+def decode_audio(video_path):
+    """Decode a video's audio track into a 16 kHz mono float32 NumPy array"""
+    print("⏳ Decoding audio into memory...")
+    
+    process = subprocess.Popen(_pcm_decode_command(video_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+    try:
+        audio = _read_pcm_stream(process.stdout)
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr_reader.join()
+    
+    if process.returncode != 0 or audio.size == 0:
+        stderr = b"".join(stderr_chunks).decode(errors="ignore").strip()
+        print(f"❌ Audio decode error: {stderr}")
+        raise subprocess.CalledProcessError(process.returncode, "ffmpeg", stderr=stderr)
+    
+    print(f"✅ Decoded {audio.size / AUDIO_SAMPLE_RATE:.1f} seconds of audio into memory")
+    return audio
+
+def extract_audio(video_path, output_path=None):
+    """Extract audio from video using ffmpeg into a WAV file (unique per call by default)"""
     print("⏳ Extracting audio...")
     
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(prefix="andy_audio_", suffix=".wav")
+        os.close(fd)
+    
     try:
         command = [
             "ffmpeg", 
@@ -325,49 +1144,136 @@ def extract_audio(video_path, output_path="temp_audio.wav"):
         print(f"❌ Audio extraction error: {str(e)}")
         raise
 
-def transcribe_audio_with_timestamps(audio_path):
-    """Transcribe audio with timestamps using Whisper"""
+def transcribe_audio_with_timestamps(audio_path, timings=None):
+    """Transcribe audio with timestamps using the shared Whisper model.
+
+    ``audio_path`` may be a file path or a 16 kHz mono float32 NumPy array.
+
+    If a ``timings`` dict is passed it is filled with the model load time paid
+    by this call (0 when the model was already warm) and the transcription time.
+    """
+    if transcription_pool is not None and isinstance(audio_path, np.ndarray):
+        return transcribe_audio_chunked(audio_path, timings)
+    
     print("⏳ Transcribing audio with timestamps...")
     
     try:
-        model = whisper.load_model("tiny")
+        was_warm = whisper_registry.is_loaded()
+        load_start = time.time()
+        whisper_registry.get_model()
+        load_time = 0.0 if was_warm else time.time() - load_start
         try:
-            result = model.transcribe(
+            result, transcription_time = whisper_registry.transcribe(
                 audio_path, 
                 language="en",
                 word_timestamps=True
             )
             has_word_timestamps = True
         except:
-            result = model.transcribe(
+            result, transcription_time = whisper_registry.transcribe(
                 audio_path,
                 language="en"
             )
             has_word_timestamps = False
         
         transcript = result["text"]
-        timestamps = []
-        if has_word_timestamps and "words" in result:
-            for word in result["words"]:
-                timestamps.append({
-                    "text": word["word"],
-                    "start": word["start"],
-                    "end": word["end"]
-                })
-        elif "segments" in result:
-            for segment in result["segments"]:
-                timestamps.append({
-                    "text": segment["text"],
-                    "start": segment["start"],
-                    "end": segment["end"]
-                })
+        timestamps = _result_to_timestamps(result, has_word_timestamps)
+        
+        if timings is not None:
+            timings.update({
+                "model_size": whisper_registry.model_size,
+                "backend": whisper_registry.backend,
+                "model_was_warm": was_warm,
+                "model_load_time": load_time,
+                "transcription_time": transcription_time
+            })
                 
-        print(f"✅ Transcription complete: {len(transcript)} characters with timestamps")
+        print(f"✅ Transcription complete: {len(transcript)} characters with timestamps "
+              f"(model load: {load_time:.2f}s, transcription: {transcription_time:.2f}s)")
+        return transcript, timestamps
+    except Exception as e:
+        print(f"❌ Transcription error: {str(e)}")
+        raise
+
+def transcribe_audio_chunked(audio, timings=None):
+    """Transcribe a PCM array as VAD-trimmed overlapping windows across the transcription pool"""
+    print(f"⏳ Transcribing audio in parallel windows ({TRANSCRIBE_WORKERS} workers)...")
+    
+    try:
+        transcribe_start = time.time()
+        regions = detect_speech_regions(audio, AUDIO_SAMPLE_RATE)
+        windows = plan_transcription_windows(regions, AUDIO_SAMPLE_RATE)
+        speech_seconds = sum(end - start for start, end in regions) / AUDIO_SAMPLE_RATE
+        print(f"📊 VAD kept {speech_seconds:.1f}s of {len(audio) / AUDIO_SAMPLE_RATE:.1f}s audio in {len(windows)} windows")
+        
+        window_results = transcription_pool.map(
+            _transcribe_window,
+            [(audio[start:end], start / AUDIO_SAMPLE_RATE) for start, end, _, _ in windows]
+        )
+        
+        # Stitch windows back into one timeline, keeping each overlap once
+        timestamps = []
+        for (_, _, keep_start, keep_end), window_timestamps in zip(windows, window_results):
+            keep_from = keep_start / AUDIO_SAMPLE_RATE
+            keep_until = keep_end / AUDIO_SAMPLE_RATE
+            timestamps.extend(t for t in window_timestamps if keep_from <= t["start"] < keep_until)
+        transcript = "".join(t["text"] for t in timestamps)
+        transcription_time = time.time() - transcribe_start
+        
+        if timings is not None:
+            timings.update({
+                "model_size": WHISPER_MODEL_SIZE,
+                "backend": WHISPER_BACKEND,
+                "model_was_warm": True,
+                "model_load_time": 0.0,
+                "transcription_time": transcription_time,
+                "workers": TRANSCRIBE_WORKERS,
+                "windows": len(windows),
+                "audio_seconds": len(audio) / AUDIO_SAMPLE_RATE,
+                "speech_seconds": speech_seconds
+            })
+        
+        print(f"✅ Transcription complete: {len(transcript)} characters with timestamps "
+              f"(transcription: {transcription_time:.2f}s)")
         return transcript, timestamps
     except Exception as e:
         print(f"❌ Transcription error: {str(e)}")
         raise
 
+# Frame alignment modes: "round_robin" pairs frame batch i with chunk i % n;
+# "aligned" only sends frames shown while a chunk was being spoken, with that chunk.
+FRAME_ALIGNMENT_MODES = ("round_robin", "aligned")
+FRAME_ALIGNMENT_MODE = os.getenv("FRAME_ALIGNMENT_MODE", "round_robin")
+
+def align_frames_to_chunks(frames, frame_timestamps, frame_indices, chunks, chunk_timestamps, batch_size=2):
+    """Build one frame batch per transcript chunk from frames inside the chunk's time window.
+
+    Chunks with no frame on screen during their time range get no batch. When
+    more than ``batch_size`` frames fall inside a window, evenly spaced ones are
+    kept. Returns (frame_batches, index_batches, batch_chunks).
+    """
+    order = sorted(range(len(frames)), key=lambda i: frame_timestamps[i])
+    sorted_times = [frame_timestamps[i] for i in order]
+    
+    frame_batches = []
+    index_batches = []
+    batch_chunks = []
+    for chunk, chunk_time in zip(chunks, chunk_timestamps):
+        first = bisect.bisect_left(sorted_times, chunk_time["start"])
+        last = bisect.bisect_right(sorted_times, chunk_time["end"])
+        in_window = order[first:last]
+        if not in_window:
+            continue
+        if len(in_window) > batch_size:
+            picks = np.linspace(0, len(in_window) - 1, batch_size).round().astype(int)
+            in_window = [in_window[p] for p in picks]
+        frame_batches.append([frames[i] for i in in_window])
+        index_batches.append([frame_indices[i] for i in in_window] if frame_indices else None)
+        batch_chunks.append(chunk)
+    
+    print(f"🎯 Aligned {sum(len(b) for b in frame_batches)} frames to {len(frame_batches)}/{len(chunks)} transcript chunks")
+    return frame_batches, index_batches, batch_chunks
+
 def split_frames_into_micro_batches(frames, batch_size=2, frame_indices=None):
     """Split frames into micro batches for vision analysis"""
     if frame_indices:
@@ -377,60 +1283,183 @@ def split_frames_into_micro_batches(frames, batch_size=2, frame_indices=None):
     else:
         return [frames[i:i+batch_size] for i in range(0, len(frames), batch_size)]
 
+SENTENCE_PATTERN = re.compile(r'[^.!?]*[.!?]|[^.!?]+$')
+
+def _timestamp_char_offsets(timestamps):
+    """Cumulative character offsets of each timestamp entry's text"""
+    starts = []
+    ends = []
+    offset = 0
+    for entry in timestamps:
+        starts.append(offset)
+        offset += len(entry["text"])
+        ends.append(offset)
+    return starts, ends
+
 def split_transcript(transcript, timestamps=None, chunk_size=1000):
-    """Split transcript into manageable chunks with timestamps when available"""
+    """Split transcript into sentence-aligned chunks of at most ``chunk_size`` characters.
+
+    Runs in a single pass over the transcript. When ``timestamps`` are given,
+    returns ``(chunks, chunk_timestamps)`` where each entry is a
+    ``{"start", "end"}`` time range in seconds covering that chunk's text.
+    """
     if not transcript:
-        return []
-        
-    sentences = []
-    current_sentence = ""
-    
-    for char in transcript:
-        current_sentence += char
-        if char in ['.', '!', '?'] and len(current_sentence.strip()) > 0:
-            sentences.append(current_sentence)
-            current_sentence = ""
+        return ([], []) if timestamps else []
     
-    if current_sentence:
-        sentences.append(current_sentence)
+    # Each '.', '!' or '?' ends a sentence; trailing text forms the last one
+    sentences = SENTENCE_PATTERN.findall(transcript)
     
     chunks = []
-    chunk_timestamps = []
-    current_chunk = ""
+    chunk_spans = []  # (start_char, end_char) of each chunk within the transcript
+    current_parts = []
+    current_length = 0
+    current_start = 0
+    position = 0
     
     for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= chunk_size:
-            current_chunk += sentence
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-                chunk_timestamps.append(None)
-            current_chunk = sentence
+        if current_parts and current_length + len(sentence) > chunk_size:
+            chunks.append("".join(current_parts))
+            chunk_spans.append((current_start, position))
+            current_parts = []
+            current_length = 0
+            current_start = position
+        current_parts.append(sentence)
+        current_length += len(sentence)
+        position += len(sentence)
+    
+    if current_parts:
+        chunks.append("".join(current_parts))
+        chunk_spans.append((current_start, position))
     
-    if current_chunk:
-        chunks.append(current_chunk)
-        chunk_timestamps.append(None)
+    if not timestamps:
+        return chunks
     
-    if timestamps:
-        return chunks, chunk_timestamps
-    return chunks
+    # Map character spans onto the timestamp entries. Their concatenated text
+    # matches the transcript up to whitespace, so scale offsets to absorb drift.
+    entry_starts, entry_ends = _timestamp_char_offsets(timestamps)
+    scale = entry_ends[-1] / len(transcript) if entry_ends[-1] else 0
+    chunk_timestamps = []
+    for start_char, end_char in chunk_spans:
+        first = min(bisect.bisect_right(entry_ends, start_char * scale), len(timestamps) - 1)
+        last = max(bisect.bisect_left(entry_starts, end_char * scale) - 1, first)
+        chunk_timestamps.append({
+            "start": timestamps[first]["start"],
+            "end": timestamps[last]["end"]
+        })
+    return chunks, chunk_timestamps
+
+# Pipeline stage scheduling
+class StageGraph:
+    """Runs named stages concurrently as soon as the stages they depend on finish.
+
+    Each stage is called with the results of its ``deps`` as positional
+    arguments, in the order they were declared.
+    """
+    def __init__(self):
+        self.stages = OrderedDict()  # name -> (fn, deps)
+
+    def add(self, name, fn, deps=()):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = (fn, tuple(deps))
+
+    def run(self):
+        """Run every stage; returns (results, timings) keyed by stage name"""
+        results = {}
+        timings = {}
+        graph_start = time.time()
+        pending = dict(self.stages)
+        running = {}
+        
+        def timed(name, fn, args):
+            stage_start = time.time()
+            try:
+                return fn(*args)
+            finally:
+                timings[name] = {
+                    "start": stage_start - graph_start,
+                    "duration": time.time() - stage_start
+                }
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.stages))) as executor:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        args = [results[dep] for dep in deps]
+                        running[executor.submit(timed, name, fn, args)] = name
+                        del pending[name]
+                
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+        
+        return results, dict(sorted(timings.items(), key=lambda item: item[1]["start"]))
 
 # Content analysis coordinator
 class ContentBasedVideoAnalysisCoordinator:
     """Coordinates agents to analyze video content with focus on transcript concepts and quotes"""
-    def __init__(self):
+    def __init__(self, client=None):
+        client = client or get_groq_client()
         self.agents = {
-            "vision": FrameAnalysisAgent("Vision Agent", "llama3-70b-8192", max_tokens=300),
-            "transcript": TranscriptAgent("Transcript Agent", "llama3-8b-8192", max_tokens=300),
-            "summary": SummaryAgent("Summary Agent", "llama3-70b-8192", max_tokens=800),
-            "segmentation": SegmentationAgent("Segmentation Agent", "llama3-8b-8192", max_tokens=300)
+            "vision": FrameAnalysisAgent("Vision Agent", "llama3-70b-8192", max_tokens=300, client=client),
+            "transcript": TranscriptAgent("Transcript Agent", "llama3-8b-8192", max_tokens=300, client=client),
+            "summary": SummaryAgent("Summary Agent", "llama3-70b-8192", max_tokens=800, client=client),
+            "segmentation": SegmentationAgent("Segmentation Agent", "llama3-8b-8192", max_tokens=300, client=client)
         }
         self.results_queue = queue.Queue()
         self.worker_count = 0
         self.lock = threading.Lock()
     
-    def analyze_video(self, video_path, max_workers=4):
-        """Main method to analyze video content based on transcript concepts"""
+    def _lookup_stage(self, cache_key, checkpoint, stage):
+        """Find a stage result in the job checkpoint, then the analysis cache; returns (hit, value)"""
+        if checkpoint:
+            hit, value = checkpoint.get(stage)
+            if hit:
+                print(f"↩️ Resuming {stage} from checkpoint")
+                return True, value
+        if cache_key and analysis_cache:
+            hit, value = analysis_cache.get(cache_key, stage)
+            if hit:
+                print(f"💾 Cache hit for {stage}")
+                if checkpoint:
+                    checkpoint.put(stage, value)
+                return True, value
+        return False, None
+    
+    def _cached_stage(self, cache_key, stage, compute, checkpoint=None):
+        """Return a stage result from the checkpoint or analysis cache, computing and storing it on a miss"""
+        hit, value = self._lookup_stage(cache_key, checkpoint, stage)
+        if hit:
+            return value
+        return self._store_stage(cache_key, stage, compute(), checkpoint)
+    
+    def _store_stage(self, cache_key, stage, value, checkpoint=None):
+        """Save a computed stage result to the job checkpoint and the analysis cache"""
+        if checkpoint:
+            checkpoint.put(stage, value)
+        if cache_key and analysis_cache:
+            analysis_cache.put(cache_key, stage, value)
+        return value
+    
+    def analyze_video(self, video_path, max_workers=4, cache_key=None, audio=None, checkpoint=None):
+        """Main method to analyze video content based on transcript concepts.
+
+        The pipeline runs as a StageGraph: each stage starts once its inputs
+        are ready, and all per-chunk LLM calls share one pool of ``max_workers``.
+        With a ``cache_key`` (see AnalysisCache.make_key) each stage is read
+        from the analysis cache when present and written to it otherwise.
+        With a JobCheckpoint every completed stage is saved as it finishes, so
+        a retried job resumes after the last stage that succeeded.
+        ``audio`` already extracted by the caller (streaming ingest), either a
+        WAV path or a PCM array, is transcribed directly.
+        """
         start_time = time.time()
         print(f"🎓 TRANSCRIPT-FOCUSED VIDEO ANALYSIS: {video_path}")
         print("=" * 60)
@@ -438,122 +1467,175 @@ class ContentBasedVideoAnalysisCoordinator:
         if not validate_video_file(video_path):
             raise ValueError("Invalid or corrupted video file")
         
-        frames = None
-        frame_timestamps = None
-        frame_indices = None
-        audio_path = None
+        transcription_metrics = {}
+        provided_audio = audio
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            frames_future = executor.submit(extract_keyframes, video_path, max_frames=20, return_timestamps=True)
-            audio_future = executor.submit(extract_audio, video_path)
-            
-            frames_result = frames_future.result()
-            if len(frames_result) == 3:
-                frames, frame_timestamps, frame_indices = frames_result
-            else:
-                frames = frames_result
-                frame_timestamps = None
-                frame_indices = None
-            
+        def transcribe_stage():
+            if provided_audio is not None or AUDIO_DECODE_MODE == "memory":
+                audio = provided_audio
+                if audio is None:
+                    try:
+                        audio = decode_audio(video_path)
+                    except Exception as e:
+                        print(f"⚠️ Audio extraction failed: {e}. Cannot proceed without transcript.")
+                        raise ValueError("Audio extraction failed, transcript required for analysis.")
+                transcript, timestamps = transcribe_audio_with_timestamps(audio, timings=transcription_metrics)
+                return {"transcript": transcript, "timestamps": timestamps}
+            audio_path = None
             try:
-                audio_path = audio_future.result()
-            except Exception as e:
-                print(f"⚠️ Audio extraction failed: {e}. Cannot proceed without transcript.")
-                raise ValueError("Audio extraction failed, transcript required for analysis.")
+                try:
+                    audio_path = extract_audio(video_path)
+                except Exception as e:
+                    print(f"⚠️ Audio extraction failed: {e}. Cannot proceed without transcript.")
+                    raise ValueError("Audio extraction failed, transcript required for analysis.")
+                transcript, timestamps = transcribe_audio_with_timestamps(audio_path, timings=transcription_metrics)
+                return {"transcript": transcript, "timestamps": timestamps}
+            finally:
+                if audio_path and os.path.exists(audio_path):
+                    os.remove(audio_path)
         
-        transcript, timestamps = transcribe_audio_with_timestamps(audio_path)
-        if not transcript:
-            raise ValueError("Transcription failed, cannot proceed without transcript.")
+        def chunk_stage(transcript_entry):
+            if not transcript_entry["transcript"]:
+                raise ValueError("Transcription failed, cannot proceed without transcript.")
+            # Chunk once per job; every chunk-based stage reuses the same split
+            if transcript_entry["timestamps"]:
+                chunks, chunk_timestamps = split_transcript(transcript_entry["transcript"], transcript_entry["timestamps"])
+            else:
+                chunks = split_transcript(transcript_entry["transcript"])
+                chunk_timestamps = [None] * len(chunks)
+            return {"chunks": chunks, "chunk_timestamps": chunk_timestamps}
         
-        transcript_analyses = self._process_transcript_with_quotes(transcript, timestamps, max_workers)
-        transcript_quotes = self._extract_speaker_quotes(transcript, max_workers)
-        content_segments = self.agents["segmentation"].identify_segments(transcript)
+        def run_stage(stage, compute):
+            return self._cached_stage(cache_key, stage, compute, checkpoint)
         
-        visual_examples = self._process_frames_for_examples(frames, frame_indices, transcript, max_workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as llm_executor:
+            graph = StageGraph()
+            graph.add("transcript", lambda: run_stage("transcript", transcribe_stage))
+            graph.add("chunks", chunk_stage, deps=("transcript",))
+            if TRANSCRIPT_EXTRACTION_MODE == "combined":
+                graph.add("chunk_insights", lambda c: run_stage("chunk_insights",
+                    lambda: self._extract_chunk_insights(c["chunks"], llm_executor)), deps=("chunks",))
+                graph.add("transcript_analyses", lambda i: [a for a, _ in i if a], deps=("chunk_insights",))
+                # Same budget as the separate extraction: quotes from the first 5 chunks
+                graph.add("speaker_quotes", lambda i: [q for _, q in i[:5] if q], deps=("chunk_insights",))
+            else:
+                graph.add("transcript_analyses", lambda c: run_stage("transcript_analyses",
+                    lambda: self._process_transcript_with_quotes(c["chunks"], llm_executor)), deps=("chunks",))
+                graph.add("speaker_quotes", lambda c: run_stage("speaker_quotes",
+                    lambda: self._extract_speaker_quotes(c["chunks"], llm_executor)), deps=("chunks",))
+            graph.add("content_segments", lambda _, t: run_stage("content_segments",
+                lambda: self.agents["segmentation"].identify_segments(t["transcript"])), deps=("chunks", "transcript"))
+            
+            # Frames are only decoded when visual examples have to be computed
+            visual_hit, cached_visual_examples = self._lookup_stage(cache_key, checkpoint, "visual_examples")
+            if visual_hit:
+                graph.add("visual_examples", lambda: cached_visual_examples)
+            else:
+                graph.add("frames", lambda: extract_keyframes(video_path, max_frames=20, return_timestamps=True))
+                # Already looked up above; store without counting a second miss
+                graph.add("visual_examples", lambda f, c: self._store_stage(cache_key, "visual_examples",
+                    self._process_frames_for_examples(f[0], f[2], c["chunks"], llm_executor,
+                                                      f[1], c["chunk_timestamps"]), checkpoint),
+                    deps=("frames", "chunks"))
+            
+            graph.add("explanation", lambda a, q, v: run_stage("explanation",
+                lambda: self._generate_transcript_based_explanation(a, q, v)),
+                deps=("transcript_analyses", "speaker_quotes", "visual_examples"))
+            
+            results, stage_timings = graph.run()
         
-        final_analysis = self._generate_transcript_based_explanation(
-            transcript_analyses,
-            transcript_quotes,
-            visual_examples
-        )
+        if not transcription_metrics:
+            transcription_metrics = {"cached": True}
         
         total_time = time.time() - start_time
         print(f"⏱️ Total analysis time: {total_time:.2f} seconds")
-        
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)
+        for name, timing in stage_timings.items():
+            print(f"   {name}: {timing['duration']:.2f}s (started at +{timing['start']:.2f}s)")
         
         return {
-            "explanation": final_analysis,
+            "explanation": results["explanation"],
             "processing_time": total_time,
-            "transcript_analyses": transcript_analyses,
-            "speaker_quotes": transcript_quotes,
-            "visual_examples": visual_examples,
-            "transcript": transcript,
-            "content_segments": content_segments
+            "stage_timings": stage_timings,
+            "transcription_metrics": transcription_metrics,
+            "transcript_analyses": results["transcript_analyses"],
+            "speaker_quotes": results["speaker_quotes"],
+            "visual_examples": results["visual_examples"],
+            "transcript": results["transcript"]["transcript"],
+            "content_segments": results["content_segments"]
         }
     
-    def _process_frames_for_examples(self, frames, frame_indices, transcript, max_workers):
+    def _process_frames_for_examples(self, frames, frame_indices, chunks, executor,
+                                     frame_timestamps=None, chunk_timestamps=None):
         """Process frames to extract examples supporting transcript content"""
         print(f"⏳ Processing {len(frames)} frames for visual examples...")
         
-        chunks = split_transcript(transcript)
-        if frame_indices:
-            frame_batches, index_batches = split_frames_into_micro_batches(frames, batch_size=2, frame_indices=frame_indices)
+        has_chunk_times = chunk_timestamps and all(chunk_timestamps)
+        if FRAME_ALIGNMENT_MODE == "aligned" and frame_timestamps and has_chunk_times:
+            frame_batches, index_batches, batch_chunks = align_frames_to_chunks(
+                frames, frame_timestamps, frame_indices, chunks, chunk_timestamps, batch_size=2
+            )
         else:
-            frame_batches = split_frames_into_micro_batches(frames, batch_size=2)
-            index_batches = [None] * len(frame_batches)
+            if frame_indices:
+                frame_batches, index_batches = split_frames_into_micro_batches(frames, batch_size=2, frame_indices=frame_indices)
+            else:
+                frame_batches = split_frames_into_micro_batches(frames, batch_size=2)
+                index_batches = [None] * len(frame_batches)
+            batch_chunks = [chunks[i % len(chunks)] for i in range(len(frame_batches))]
         
         analyses = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.agents["vision"].analyze_frames, batch, chunks[i % len(chunks)], indices) 
-                      for i, (batch, indices) in enumerate(zip(frame_batches, index_batches))]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    analyses.append(result)
+        futures = [executor.submit(self.agents["vision"].analyze_frames, batch, chunk, indices) 
+                  for batch, indices, chunk in zip(frame_batches, index_batches, batch_chunks)]
+        
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result:
+                analyses.append(result)
         
         print(f"✅ Processed {len(analyses)}/{len(frame_batches)} frame batches for examples")
         return self.agents["summary"].extract_visual_examples(analyses)
     
-    def _process_transcript_with_quotes(self, transcript, timestamps, max_workers):
-        """Process transcript to extract concepts and quotes"""
+    def _process_transcript_with_quotes(self, chunks, executor):
+        """Process transcript chunks to extract concepts and quotes"""
         print(f"⏳ Processing transcript for concepts and quotes...")
         
-        if timestamps:
-            chunks, chunk_timestamps = split_transcript(transcript, timestamps)
-        else:
-            chunks = split_transcript(transcript)
-        
         analyses = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.agents["transcript"].analyze_transcript, chunk, i) 
-                      for i, chunk in enumerate(chunks)]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    analyses.append(result)
+        futures = [executor.submit(self.agents["transcript"].analyze_transcript, chunk, i) 
+                  for i, chunk in enumerate(chunks)]
+        
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result:
+                analyses.append(result)
         
         print(f"✅ Processed {len(analyses)}/{len(chunks)} transcript chunks")
         return analyses
     
-    def _extract_speaker_quotes(self, transcript, max_workers):
+    def _extract_chunk_insights(self, chunks, executor):
+        """Extract concepts, quotes and examples from every chunk with one call per chunk.
+
+        Returns [(analysis, quotes)] in chunk order, formatted for the summary agent.
+        """
+        print(f"⏳ Extracting concepts and quotes from {len(chunks)} chunks (combined)...")
+        
+        agent = self.agents["transcript"]
+        insights = list(executor.map(agent.extract_chunk_insights, chunks))
+        formatted = [agent.format_insights(chunk_insights) for chunk_insights in insights]
+        
+        print(f"✅ Extracted insights from {len(formatted)} transcript chunks")
+        return formatted
+    
+    def _extract_speaker_quotes(self, chunks, executor):
         """Extract 2-3 direct quotes per transcript chunk"""
         print(f"⏳ Extracting speaker quotes...")
         
-        chunks = split_transcript(transcript)
-        
         quotes = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers//2) as executor:
-            futures = [executor.submit(self.agents["transcript"].extract_quotes, chunk) 
-                      for chunk in chunks[:5]]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    quotes.append(result)
+        futures = [executor.submit(self.agents["transcript"].extract_quotes, chunk) 
+                  for chunk in chunks[:5]]
+        
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result:
+                quotes.append(result)
         
         print(f"✅ Extracted speaker quotes")
         return quotes
@@ -572,41 +1654,57 @@ class ContentBasedVideoAnalysisCoordinator:
         return explanation
 
 # Google Drive download function
-def download_google_drive_file(url, output_path):
-    """Download a file from Google Drive using the file ID."""
-    print(f"⏳ Downloading video from: {url}")
-    
+def extract_drive_file_id(url):
+    """Extract the file ID from a Google Drive share URL."""
     file_id_match = re.search(r'file/d/([a-zA-Z0-9_-]+)', url)
     if not file_id_match:
         raise ValueError("Invalid Google Drive URL: Could not extract file ID")
-    
-    file_id = file_id_match.group(1)
+    return file_id_match.group(1)
+
+# Streaming ingest: tee the download into ffmpeg so audio extraction overlaps it
+STREAMING_INGEST = os.getenv("STREAMING_INGEST", "false").lower() == "true"
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+
+def _open_google_drive_download(url):
+    """Open a streaming response for a Google Drive file, handling the confirm step."""
+    file_id = extract_drive_file_id(url)
     download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
     
     session = requests.Session()
+    response = session.get(download_url, stream=True, timeout=60)
+    response.raise_for_status()
+    
+    for key, value in response.headers.items():
+        if key.lower() == 'set-cookie' and 'download_warning' in value:
+            confirm_token = re.search(r'download_warning_[^=]+=(.+?);', value)
+            if confirm_token:
+                confirm_token = confirm_token.group(1)
+                download_url = f"{download_url}&confirm={confirm_token}"
+                response = session.get(download_url, stream=True, timeout=60)
+                response.raise_for_status()
+    
+    content_type = response.headers.get('content-type', '')
+    if 'video' not in content_type.lower() and 'application/octet-stream' not in content_type.lower():
+        raise ValueError(f"Downloaded file is not a video (Content-Type: {content_type})")
+    
+    return response
+
+def download_google_drive_file(url, output_path, digest=None):
+    """Download a file from Google Drive using the file ID.
+
+    If a hashlib ``digest`` is passed it is updated with the downloaded bytes.
+    """
+    print(f"⏳ Downloading video from: {url}")
     
     try:
-        response = session.get(download_url, stream=True, timeout=60)
-        response.raise_for_status()
-        
-        cookies = response.cookies
-        for key, value in response.headers.items():
-            if key.lower() == 'set-cookie' and 'download_warning' in value:
-                confirm_token = re.search(r'download_warning_[^=]+=(.+?);', value)
-                if confirm_token:
-                    confirm_token = confirm_token.group(1)
-                    download_url = f"{download_url}&confirm={confirm_token}"
-                    response = session.get(download_url, stream=True, timeout=60)
-                    response.raise_for_status()
-        
-        content_type = response.headers.get('content-type', '')
-        if 'video' not in content_type.lower() and 'application/octet-stream' not in content_type.lower():
-            raise ValueError(f"Downloaded file is not a video (Content-Type: {content_type})")
+        response = _open_google_drive_download(url)
         
         with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                 if chunk:
                     f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
         
         file_size = os.path.getsize(output_path) / (1024 * 1024)  # Size in MB
         print(f"✅ Video downloaded to: {output_path} (Size: {file_size:.2f} MB)")
@@ -619,6 +1717,504 @@ def download_google_drive_file(url, output_path):
         print(f"❌ Error processing download: {e}")
         raise
 
+def download_google_drive_file_streaming(url, output_path, audio_output_path=None, digest=None):
+    """Download a Drive video while extracting its audio from the same byte stream.
+
+    Every chunk is spooled to ``output_path`` (for frame extraction) and written
+    to an ffmpeg process reading stdin, so the audio is ready when the download
+    finishes. The audio is decoded to a float32 NumPy array, or written to
+    ``audio_output_path`` as WAV when one is given. Returns ``(output_path, audio)``;
+    ``audio`` is None when ffmpeg could not demux the stream (e.g. an MP4 whose
+    moov atom is at the end) and must be extracted from the spooled file instead.
+    """
+    print(f"⏳ Streaming video from: {url}")
+    
+    if audio_output_path:
+        command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ac", "1",
+            "-ar", "16000",
+            "-vn",
+            audio_output_path,
+            "-y"
+        ]
+    else:
+        command = _pcm_decode_command("pipe:0")
+    ffmpeg_process = None
+    pcm_result = []
+    stderr_chunks = []
+    readers = []
+    
+    try:
+        response = _open_google_drive_download(url)
+        ffmpeg_process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if audio_output_path else subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        # Drain ffmpeg's outputs concurrently so it never blocks while we feed stdin
+        readers.append(threading.Thread(target=lambda: stderr_chunks.append(ffmpeg_process.stderr.read()), daemon=True))
+        if not audio_output_path:
+            readers.append(threading.Thread(target=lambda: pcm_result.append(_read_pcm_stream(ffmpeg_process.stdout)), daemon=True))
+        for reader in readers:
+            reader.start()
+        teeing = True
+        
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                if teeing:
+                    try:
+                        ffmpeg_process.stdin.write(chunk)
+                    except (BrokenPipeError, OSError):
+                        # ffmpeg gave up on the stream; keep downloading and fall back later
+                        teeing = False
+        
+        try:
+            ffmpeg_process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            ffmpeg_process.wait(timeout=300)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            # The spooled file is complete; treat a stuck ffmpeg like a demux failure
+            ffmpeg_process.kill()
+            ffmpeg_process.wait()
+            timed_out = True
+        for reader in readers:
+            reader.join()
+        
+        file_size = os.path.getsize(output_path) / (1024 * 1024)  # Size in MB
+        print(f"✅ Video downloaded to: {output_path} (Size: {file_size:.2f} MB)")
+        
+        if timed_out:
+            print("⚠️ Streaming audio extraction timed out, falling back to file")
+            return output_path, None
+        
+        if ffmpeg_process.returncode == 0:
+            if audio_output_path and os.path.exists(audio_output_path) and os.path.getsize(audio_output_path) > 0:
+                print(f"✅ Audio extracted during download to {audio_output_path}")
+                return output_path, audio_output_path
+            if not audio_output_path and pcm_result and pcm_result[0].size > 0:
+                print(f"✅ Audio decoded during download ({pcm_result[0].size / AUDIO_SAMPLE_RATE:.1f} seconds)")
+                return output_path, pcm_result[0]
+        
+        stderr = b"".join(stderr_chunks).decode(errors='ignore').strip()
+        print(f"⚠️ Streaming audio extraction failed, falling back to file: {stderr}")
+        return output_path, None
+    
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error downloading video: {e}")
+        raise
+    except Exception as e:
+        print(f"❌ Error processing download: {e}")
+        raise
+    finally:
+        if ffmpeg_process and ffmpeg_process.poll() is None:
+            ffmpeg_process.kill()
+            ffmpeg_process.wait()
+
+# Video analysis job
+def analyze_video_resource(url, use_cache=True, checkpoint=None):
+    """Download a Drive video and analyze it; returns the analysis_data for its resources doc.
+
+    With a JobCheckpoint the download is kept in the checkpoint and every
+    finished stage is saved there, so a retry skips straight to what failed.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        audio = None
+        if checkpoint and checkpoint.has_video():
+            print(f"↩️ Resuming job {checkpoint.job_id} (done: {', '.join(checkpoint.completed_stages())})")
+            temp_video_path = checkpoint.video_path
+            content_hash = checkpoint.get("meta")[1]["content_hash"]
+        else:
+            temp_video_path = checkpoint.video_path if checkpoint else os.path.join(temp_dir, f"temp_video_{uuid.uuid4()}.mp4")
+            content_digest = hashlib.sha256()
+            if STREAMING_INGEST:
+                audio_output_path = os.path.join(temp_dir, "audio.wav") if AUDIO_DECODE_MODE == "file" else None
+                _, audio = download_google_drive_file_streaming(
+                    url, temp_video_path, audio_output_path, digest=content_digest
+                )
+            else:
+                download_google_drive_file(url, temp_video_path, digest=content_digest)
+            content_hash = content_digest.hexdigest()
+            
+            if not os.path.exists(temp_video_path) or os.path.getsize(temp_video_path) == 0:
+                raise ValueError("Downloaded video file is empty or does not exist")
+            
+            if checkpoint:
+                checkpoint.put("meta", {"url": url, "content_hash": content_hash, "size": os.path.getsize(temp_video_path)})
+        
+        cache_key = AnalysisCache.make_key(extract_drive_file_id(url), content_hash) if use_cache else None
+        
+        if not validate_video_file(temp_video_path):
+            raise ValueError("Downloaded video file is invalid or corrupted")
+        
+        coordinator = ContentBasedVideoAnalysisCoordinator()
+        result = coordinator.analyze_video(temp_video_path, max_workers=4, cache_key=cache_key, audio=audio,
+                                           checkpoint=checkpoint)
+        
+        # Prepare the analysis data to write to Firebase
+        return {
+            'analysis': result['explanation'],  # The transcript-based explanation
+            'transcript': result.get('transcript', ''),
+            'content_segments': result.get('content_segments', ''),
+            'processing_time': result['processing_time'],
+            'stage_timings': result.get('stage_timings', {}),
+            'transcription_metrics': result.get('transcription_metrics', {}),
+            'status': 'completed',
+            'last_updated': datetime.utcnow().isoformat()
+        }
+
+def run_video_analysis(url, resource_id, job_id=None):
+    """Download a Drive video, analyze it and write the result to its resources doc.
+
+    With a ``job_id`` progress is checkpointed per stage; a failed job can be
+    rerun with the same ID and resumes instead of starting over.
+    """
+    checkpoint = JobCheckpoint(job_id) if job_id else None
+    try:
+        # Update status to 'processing' in Firebase
+        db.collection('resources').document(resource_id).update({
+            'status': 'processing',
+            'last_updated': datetime.utcnow().isoformat()
+        })
+        
+        analysis_data = analyze_video_resource(url, checkpoint=checkpoint)
+        
+        # Write to Firebase under the resources collection
+        db.collection('resources').document(resource_id).update(analysis_data)
+        if checkpoint:
+            checkpoint.clear()
+        return analysis_data
+        
+    except Exception as e:
+        print(f"❌ Error processing video: {e}")
+        # Write error to Firebase
+        error_update = {
+            'status': 'error',
+            'error': str(e),
+            'last_updated': datetime.utcnow().isoformat()
+        }
+        if checkpoint:
+            error_update['resumable_stages'] = checkpoint.completed_stages()
+        db.collection('resources').document(resource_id).update(error_update)
+        raise
+
+# Batch backfill configuration
+BACKFILL_CHECKPOINT_DIR = os.getenv("BACKFILL_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "andy_backfill"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "2"))
+BACKFILL_WRITE_BATCH_SIZE = int(os.getenv("BACKFILL_WRITE_BATCH_SIZE", "20"))  # Firestore allows up to 500
+
+class BackfillRunner:
+    """Re-analyzes many resources docs with a worker pool, resumable from a checkpoint.
+
+    Progress is checkpointed to BACKFILL_CHECKPOINT_DIR/<run_id>.json each time
+    a batch of results is committed, so rerunning with the same ``run_id``
+    skips everything already written. Failed resources are retried on resume.
+    Set ``use_cache=False`` (or bump ANALYSIS_CACHE_VERSION) when re-analyzing
+    after prompt or model changes.
+    """
+    def __init__(self, run_id=None, statuses=None, resource_type="video", limit=None,
+                 workers=BACKFILL_WORKERS, use_cache=True):
+        self.run_id = run_id or datetime.utcnow().strftime("backfill-%Y%m%d-%H%M%S")
+        self.statuses = list(statuses or [])
+        self.resource_type = resource_type
+        self.limit = limit
+        self.workers = workers
+        self.use_cache = use_cache
+        self.lock = threading.Lock()
+        self.state = "pending"
+        self.total = 0
+        self.run_start = None
+        self.checkpoint_path = os.path.join(BACKFILL_CHECKPOINT_DIR, f"{self.run_id}.json")
+        self.checkpoint = self._load_checkpoint()
+    
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            print(f"↩️ Resuming backfill {self.run_id}: {len(checkpoint['completed'])} already done")
+            return checkpoint
+        except (OSError, ValueError):
+            return {"run_id": self.run_id, "completed": [], "failed": {}, "elapsed": 0.0}
+    
+    def _save_checkpoint(self):
+        os.makedirs(BACKFILL_CHECKPOINT_DIR, exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+    
+    def _query_resources(self):
+        query = db.collection('resources').where('type', '==', self.resource_type)
+        if self.statuses:
+            query = query.where('status', 'in', self.statuses)
+        if self.limit:
+            query = query.limit(self.limit)
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+    
+    def _flush(self, pending):
+        """Commit pending results in one Firestore batch, then checkpoint them.
+
+        One bad doc (e.g. deleted meanwhile) fails the whole batch, so on a
+        commit error each doc is written on its own and only those that still
+        fail are recorded as failed.
+        """
+        if not pending:
+            return
+        batch = db.batch()
+        for resource_id, update, _ in pending:
+            batch.update(db.collection('resources').document(resource_id), update)
+        try:
+            batch.commit()
+        except Exception as e:
+            print(f"⚠️ Backfill batch commit failed ({e}), writing {len(pending)} docs individually")
+            for index, (resource_id, update, error) in enumerate(pending):
+                try:
+                    db.collection('resources').document(resource_id).update(update)
+                except Exception as write_error:
+                    print(f"❌ Backfill write failed for {resource_id}: {write_error}")
+                    pending[index] = (resource_id, update, f"write failed: {write_error}")
+        with self.lock:
+            for resource_id, _, error in pending:
+                if error:
+                    self.checkpoint["failed"][resource_id] = error
+                else:
+                    self.checkpoint["completed"].append(resource_id)
+                    self.checkpoint["failed"].pop(resource_id, None)
+            self.checkpoint["elapsed"] = self._elapsed()
+            self._save_checkpoint()
+        pending.clear()
+    
+    def _elapsed(self):
+        previous = self.checkpoint.get("previous_elapsed", 0.0)
+        return previous + (time.time() - self.run_start if self.run_start else 0.0)
+    
+    def run(self):
+        self.state = "running"
+        self.run_start = time.time()
+        self.checkpoint["previous_elapsed"] = self.checkpoint.get("elapsed", 0.0)
+        completed = set(self.checkpoint["completed"])
+        resources = [(rid, data) for rid, data in self._query_resources() if rid not in completed]
+        self.total = len(completed) + len(resources)
+        print(f"⏳ Backfill {self.run_id}: {len(resources)} resources to analyze with {self.workers} workers")
+        
+        pending = []
+        try:
+            # Docs without a url are failed up front so progress still reaches total;
+            # like other failures they are re-checked on resume in case a url was added
+            for rid, data in resources:
+                if not data.get('url'):
+                    pending.append((rid, {
+                        'status': 'error',
+                        'error': 'missing url',
+                        'last_updated': datetime.utcnow().isoformat()
+                    }, 'missing url'))
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+            try:
+                futures = {executor.submit(analyze_video_resource, data.get('url'), self.use_cache): rid
+                           for rid, data in resources if data.get('url')}
+                for future in concurrent.futures.as_completed(futures):
+                    resource_id = futures[future]
+                    try:
+                        pending.append((resource_id, future.result(), None))
+                    except Exception as e:
+                        print(f"❌ Backfill failed for {resource_id}: {e}")
+                        pending.append((resource_id, {
+                            'status': 'error',
+                            'error': str(e),
+                            'last_updated': datetime.utcnow().isoformat()
+                        }, str(e)))
+                    if len(pending) >= BACKFILL_WRITE_BATCH_SIZE:
+                        self._flush(pending)
+            except BaseException:
+                # Aborting: don't start the remaining analyses only to discard them
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+            self._flush(pending)
+            self.state = "completed"
+        except Exception:
+            self.state = "error"
+            raise
+        finally:
+            progress = self.progress()
+            print(f"✅ Backfill {self.run_id} {self.state}: {progress['completed']}/{progress['total']} done, "
+                  f"{progress['failed']} failed, {progress['videos_per_hour']:.1f} videos/hour")
+        return self.progress()
+    
+    def progress(self):
+        with self.lock:
+            done = len(self.checkpoint["completed"])
+            failed = len(self.checkpoint["failed"])
+            elapsed = self._elapsed()
+        return {
+            "run_id": self.run_id,
+            "state": self.state,
+            "total": self.total,
+            "completed": done,
+            "failed": failed,
+            "elapsed_seconds": elapsed,
+            "videos_per_hour": (done + failed) / elapsed * 3600 if elapsed > 0 else 0.0
+        }
+
+backfill_runs = {}
+
+# Background analysis queue configuration
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_QUEUE_DEPTH = int(os.getenv("ANALYSIS_QUEUE_DEPTH", "20"))
+ANALYSIS_DRAIN_TIMEOUT = float(os.getenv("ANALYSIS_DRAIN_TIMEOUT", "600"))  # seconds
+ANALYSIS_JOB_HISTORY = 1000
+ANALYSIS_JOB_RETRIES = int(os.getenv("ANALYSIS_JOB_RETRIES", "1"))  # automatic resumes after a failure
+ANALYSIS_WORKER_POLL = 0.5  # seconds a worker waits for a job before rechecking for shutdown
+
+class AnalysisJobQueue:
+    """Bounded queue of video analysis jobs served by a fixed pool of worker threads"""
+    def __init__(self, worker_count, max_depth):
+        self.worker_count = worker_count
+        self.jobs_queue = queue.Queue(maxsize=max_depth)
+        self.jobs = OrderedDict()  # job_id -> job record, oldest first
+        self.lock = threading.Lock()
+        self.accepting = True
+        self.stop_event = threading.Event()  # set when the drain deadline passes
+        self.workers = []
+        for i in range(worker_count):
+            worker = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def is_full(self):
+        return not self.accepting or self.jobs_queue.full()
+
+    def submit(self, url, resource_id, job_id=None):
+        """Enqueue a job and return its ID; raises queue.Full when at capacity"""
+        if not self.accepting:
+            raise queue.Full("Analysis queue is shutting down")
+        job_id = job_id or str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "resource_id": resource_id,
+            "url": url,
+            "state": "queued",
+            "queued_at": datetime.utcnow().isoformat()
+        }
+        self.jobs_queue.put_nowait(job)
+        with self.lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > ANALYSIS_JOB_HISTORY:
+                self.jobs.popitem(last=False)
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                job = self.jobs_queue.get(timeout=ANALYSIS_WORKER_POLL)
+            except queue.Empty:
+                if not self.accepting:
+                    return  # drained
+                continue
+            if self.stop_event.is_set():
+                self._abandon(job, "Service shut down before the job started")
+                self.jobs_queue.task_done()
+                return
+            job["state"] = "processing"
+            job["started_at"] = datetime.utcnow().isoformat()
+            try:
+                for attempt in range(ANALYSIS_JOB_RETRIES + 1):
+                    try:
+                        run_video_analysis(job["url"], job["resource_id"], job["job_id"])
+                        break
+                    except Exception as e:
+                        if attempt == ANALYSIS_JOB_RETRIES:
+                            raise
+                        print(f"⚠️ Job {job['job_id']} failed ({e}), resuming from checkpoint "
+                              f"(attempt {attempt + 2}/{ANALYSIS_JOB_RETRIES + 1})")
+                        time.sleep(2 ** attempt)
+                job["state"] = "completed"
+            except Exception as e:
+                job["state"] = "error"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = datetime.utcnow().isoformat()
+                self.jobs_queue.task_done()
+                maybe_prune_job_checkpoints()
+
+    def stats(self):
+        with self.lock:
+            states = [job["state"] for job in self.jobs.values()]
+        return {
+            "workers": self.worker_count,
+            "queue_depth": self.jobs_queue.qsize(),
+            "max_queue_depth": self.jobs_queue.maxsize,
+            "accepting": self.accepting,
+            "jobs": {state: states.count(state) for state in ("queued", "processing", "completed", "error")}
+        }
+
+    def _abandon(self, job, reason):
+        """Mark a job that will not finish here as failed so it can be retried by ID"""
+        job["state"] = "error"
+        job["error"] = reason
+        job["finished_at"] = datetime.utcnow().isoformat()
+        try:
+            db.collection('resources').document(job["resource_id"]).update({
+                'status': 'error',
+                'error': f"{reason}; retry with /analyze/retry/{job['job_id']}",
+                'requeueable': True,
+                'last_updated': job["finished_at"]
+            })
+        except Exception as e:
+            print(f"⚠️ Could not mark abandoned job {job['job_id']}: {e}")
+
+    def shutdown(self, timeout=ANALYSIS_DRAIN_TIMEOUT):
+        """Stop accepting jobs and let the workers finish what is queued, up to ``timeout``.
+
+        Jobs still queued or running when the deadline passes are marked as
+        errors on their resources docs so they can be retried after a restart.
+        """
+        if not self.accepting:
+            return
+        self.accepting = False
+        print(f"⏳ Draining analysis queue ({self.jobs_queue.qsize()} queued)...")
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            worker.join(max(0, deadline - time.time()))
+        if not any(worker.is_alive() for worker in self.workers):
+            print("✅ Analysis queue drained")
+            return
+        
+        self.stop_event.set()
+        abandoned = 0
+        while True:
+            try:
+                job = self.jobs_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._abandon(job, "Service shut down before the job started")
+            self.jobs_queue.task_done()
+            abandoned += 1
+        with self.lock:
+            running = [job for job in self.jobs.values() if job["state"] == "processing"]
+        for job in running:
+            self._abandon(job, "Service shut down while the job was running")
+        print(f"⚠️ Drain timed out: {abandoned} queued and {len(running)} running jobs marked for retry")
+
+job_queue = AnalysisJobQueue(ANALYSIS_WORKERS, ANALYSIS_QUEUE_DEPTH)
+atexit.register(job_queue.shutdown)
+
 # Download video and analyze route
 @app.route('/analyze', methods=['POST'])
 def analyze_video():
@@ -645,60 +2241,40 @@ def analyze_video():
                 'resourceId': resource_id
             }), 200
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_video_path = os.path.join(temp_dir, f"temp_video_{uuid.uuid4()}.mp4")
-            
-            try:
-                # Update status to 'processing' in Firebase
-                db.collection('resources').document(resource_id).update({
-                    'status': 'processing',
-                    'last_updated': datetime.utcnow().isoformat()
-                })
-                
-                download_google_drive_file(url, temp_video_path)
-                
-                if not os.path.exists(temp_video_path) or os.path.getsize(temp_video_path) == 0:
-                    raise ValueError("Downloaded video file is empty or does not exist")
-                
-                if not validate_video_file(temp_video_path):
-                    raise ValueError("Downloaded video file is invalid or corrupted")
-                
-                coordinator = ContentBasedVideoAnalysisCoordinator()
-                result = coordinator.analyze_video(temp_video_path, max_workers=4)
-                
-                # Prepare the analysis data to write to Firebase
-                analysis_data = {
-                    'analysis': result['explanation'],  # The transcript-based explanation
-                    'transcript': result.get('transcript', ''),
-                    'content_segments': result.get('content_segments', ''),
-                    'processing_time': result['processing_time'],
-                    'status': 'completed',
-                    'last_updated': datetime.utcnow().isoformat()
-                }
-                
-                # Write to Firebase under the resources collection
-                db.collection('resources').document(resource_id).update(analysis_data)
-                
-                return jsonify({
-                    'status': 'success',
-                    'resourceId': resource_id,
-                    'analysis': analysis_data
-                })
-                
-            except Exception as e:
-                print(f"❌ Error processing video: {e}")
-                # Write error to Firebase
-                db.collection('resources').document(resource_id).update({
-                    'status': 'error',
-                    'error': str(e),
-                    'last_updated': datetime.utcnow().isoformat()
-                })
-                
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Error processing video: {str(e)}',
-                    'resourceId': resource_id
-                }), 500
+        if job_queue.is_full():
+            return jsonify({
+                'status': 'rejected',
+                'message': 'Analysis queue is full, retry later',
+                'resourceId': resource_id
+            }), 429
+        
+        # Mark the doc before enqueueing so a fast worker's 'processing' is never overwritten
+        job_id = str(uuid.uuid4())
+        db.collection('resources').document(resource_id).update({
+            'status': 'queued',
+            'analysis_job_id': job_id,
+            'last_updated': datetime.utcnow().isoformat()
+        })
+        try:
+            job_queue.submit(url, resource_id, job_id)
+        except queue.Full:
+            db.collection('resources').document(resource_id).update({
+                'status': 'error',
+                'error': 'Analysis queue is full',
+                'last_updated': datetime.utcnow().isoformat()
+            })
+            return jsonify({
+                'status': 'rejected',
+                'message': 'Analysis queue is full, retry later',
+                'resourceId': resource_id
+            }), 429
+        
+        return jsonify({
+            'status': 'queued',
+            'jobId': job_id,
+            'resourceId': resource_id,
+            'statusUrl': f'/analyze/status/{job_id}'
+        }), 202
     
     except Exception as e:
         print(f"❌ Server error: {e}")
@@ -707,5 +2283,148 @@ def analyze_video():
             'message': f'Server error: {str(e)}'
         }), 500
 
+@app.route('/analyze/status/<job_id>', methods=['GET'])
+def analyze_status(job_id):
+    """Report a job's state as recorded on its resources doc"""
+    try:
+        job = job_queue.get(job_id)
+        if job:
+            resource_doc = db.collection('resources').document(job['resource_id']).get()
+        else:
+            # Job from before a restart: find the resource it was written to
+            matches = list(db.collection('resources').where('analysis_job_id', '==', job_id).limit(1).stream())
+            if not matches:
+                return jsonify({'error': 'Job not found'}), 404
+            resource_doc = matches[0]
+        
+        resource = resource_doc.to_dict() or {}
+        response = {
+            'jobId': job_id,
+            'resourceId': resource_doc.id,
+            'status': resource.get('status', job['state'] if job else 'unknown'),
+            'last_updated': resource.get('last_updated')
+        }
+        if response['status'] == 'error':
+            response['error'] = resource.get('error')
+        if response['status'] == 'completed':
+            response['processing_time'] = resource.get('processing_time')
+        return jsonify(response)
+    except Exception as e:
+        print(f"❌ Status lookup error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/analyze/retry/<job_id>', methods=['POST'])
+def retry_analysis(job_id):
+    """Re-enqueue a failed job under the same ID so it resumes from its checkpoint"""
+    try:
+        job = job_queue.get(job_id)
+        if job:
+            if job['state'] in ('queued', 'processing'):
+                return jsonify({'error': 'Job is still running', 'status': job['state']}), 409
+            resource_id, url = job['resource_id'], job['url']
+        else:
+            matches = list(db.collection('resources').where('analysis_job_id', '==', job_id).limit(1).stream())
+            if not matches:
+                return jsonify({'error': 'Job not found'}), 404
+            resource_id, url = matches[0].id, (matches[0].to_dict() or {}).get('url')
+            if not url:
+                return jsonify({'error': 'Resource has no url to retry'}), 400
+        
+        if job_queue.is_full():
+            return jsonify({'status': 'rejected', 'message': 'Analysis queue is full, retry later'}), 429
+        db.collection('resources').document(resource_id).update({
+            'status': 'queued',
+            'last_updated': datetime.utcnow().isoformat()
+        })
+        job_queue.submit(url, resource_id, job_id)
+        return jsonify({
+            'status': 'queued',
+            'jobId': job_id,
+            'resourceId': resource_id,
+            'resumableStages': JobCheckpoint(job_id).completed_stages(),
+            'statusUrl': f'/analyze/status/{job_id}'
+        }), 202
+    except queue.Full:
+        return jsonify({'status': 'rejected', 'message': 'Analysis queue is full, retry later'}), 429
+    except Exception as e:
+        print(f"❌ Retry error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/analyze/queue', methods=['GET'])
+def analyze_queue_stats():
+    """Report worker count, queue depth and job states"""
+    return jsonify(job_queue.stats())
+
+@app.route('/analyze/backfill', methods=['POST'])
+def start_backfill():
+    """Start (or resume, given the same runId) a background re-analysis of resources"""
+    data = request.get_json() or {}
+    statuses = data.get('status', [])
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    runner = BackfillRunner(
+        run_id=data.get('runId'),
+        statuses=statuses,
+        resource_type=data.get('type', 'video'),
+        limit=data.get('limit'),
+        workers=int(data.get('workers', BACKFILL_WORKERS)),
+        use_cache=bool(data.get('useCache', True))
+    )
+    existing = backfill_runs.get(runner.run_id)
+    if existing and existing.state == "running":
+        return jsonify({'error': 'Backfill already running', 'progress': existing.progress()}), 409
+    backfill_runs[runner.run_id] = runner
+    threading.Thread(target=runner.run, name=f"backfill-{runner.run_id}", daemon=True).start()
+    return jsonify({'status': 'started', 'runId': runner.run_id, 'statusUrl': f'/analyze/backfill/{runner.run_id}'}), 202
+
+@app.route('/analyze/backfill/<run_id>', methods=['GET'])
+def backfill_status(run_id):
+    """Report backfill progress and throughput in videos/hour"""
+    runner = backfill_runs.get(run_id)
+    if not runner:
+        return jsonify({'error': 'Backfill run not found'}), 404
+    return jsonify(runner.progress())
+
+@app.route('/whisper/stats', methods=['GET'])
+def whisper_stats():
+    """Report the resident Whisper model's load and transcription timings"""
+    return jsonify(whisper_registry.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report analysis cache size and per-stage hit/miss counters"""
+    if not analysis_cache:
+        return jsonify({'enabled': False})
+    return jsonify(dict(analysis_cache.stats(), enabled=True))
+
+def _handle_shutdown_signal(signum, frame):
+    """Exit through atexit so queued analyses are drained before the process stops"""
+    print(f"⚠️ Received signal {signum}, shutting down")
+    sys.exit(0)
+
+def run_backfill_cli(argv):
+    """python andy.py backfill [--status error --status skipped] [--type video] [--workers N] [--run-id ID]"""
+    parser = argparse.ArgumentParser(prog="andy.py backfill", description="Re-analyze video resources in bulk")
+    parser.add_argument("--status", action="append", default=[], help="resources status to include (repeatable)")
+    parser.add_argument("--type", default="video", help="resources type to include")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--run-id", default=None, help="reuse to resume an interrupted run")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached stage results")
+    args = parser.parse_args(argv)
+    runner = BackfillRunner(
+        run_id=args.run_id,
+        statuses=args.status,
+        resource_type=args.type,
+        limit=args.limit,
+        workers=args.workers,
+        use_cache=not args.no_cache
+    )
+    print(json.dumps(runner.run(), indent=2))
+
 if __name__ == '__main__':
-    app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
+    signal.signal(signal.SIGTERM, _handle_shutdown_signal)
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        run_backfill_cli(sys.argv[2:])
+    else:
+        app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
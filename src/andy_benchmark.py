@@ -0,0 +1,269 @@
+"""Offline benchmark for the andy.py video analysis pipeline.
+
+Synthesizes a lecture-like test video with ffmpeg, serves a local
+OpenAI-compatible stub in place of Groq and runs
+ContentBasedVideoAnalysisCoordinator.analyze_video against it, reporting
+per-stage wall time, LLM call counts, tokens sent and peak RSS.
+
+Runs on a CPU-only Linux box with no network, provided ffmpeg is installed
+and the Whisper model for WHISPER_MODEL_SIZE is already in the local cache.
+The default soundtrack is speech from ffmpeg's flite source (ffmpeg built with
+--enable-libflite); otherwise pass any speech recording with --audio-file.
+Run it from src/ (andy.py loads andy.json from the working directory):
+
+    python andy_benchmark.py --duration 120 --latency-ms 300 --runs 3
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The stub ignores the key, but the OpenAI client refuses to start without one
+os.environ.setdefault("GROQ_API_KEY", "benchmark-stub")
+os.environ.setdefault("ANALYSIS_CACHE_ENABLED", "false")
+
+import andy
+
+
+STUB_REPLY_TEXT = (
+    "The speaker explains how the test pattern illustrates colour bars. "
+    "\"This pattern shows each primary colour\" is used as an example."
+)
+STUB_REPLY_JSON = json.dumps({
+    "concepts": ["Colour bars: a reference pattern for calibrating displays"],
+    "quotes": ["This pattern shows each primary colour"],
+    "examples": ["The moving test pattern"]
+})
+
+
+class StubLLMServer:
+    """Local OpenAI-compatible chat completions endpoint with fixed latency"""
+    def __init__(self, latency_ms=200, host="127.0.0.1", port=0):
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls_by_model = {}
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+                wants_json = "JSON object" in prompt
+                reply = STUB_REPLY_JSON if wants_json else STUB_REPLY_TEXT
+                prompt_tokens = andy.estimate_tokens(prompt)
+                completion_tokens = andy.estimate_tokens(reply)
+                stub.record(body.get("model", "unknown"), prompt_tokens, completion_tokens)
+                time.sleep(stub.latency)
+
+                payload = json.dumps({
+                    "id": "chatcmpl-benchmark",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def record(self, model, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "calls_by_model": dict(self.calls_by_model)
+            }
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def ffmpeg_has_flite():
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True)
+    return any(line.split()[1:2] == ["flite"] for line in result.stdout.splitlines())
+
+
+def synthesize_video(output_path, duration, audio="tts", size="1280x720", rate=25, audio_file=None):
+    """Generate a test video from ffmpeg's testsrc with a speech or tone track"""
+    if audio_file:
+        # Loop the recording; -shortest cuts it at the video's duration
+        audio_input = ["-stream_loop", "-1", "-i", audio_file]
+        audio_filter = []
+    elif audio == "tts":
+        if not ffmpeg_has_flite():
+            raise RuntimeError("This ffmpeg build has no flite source (needs --enable-libflite); "
+                               "pass a speech recording with --audio-file instead")
+        sentence = "This pattern shows each primary colour. The bars help calibrate a display. "
+        audio_input = ["-f", "lavfi", "-i", f"flite=text='{sentence * 4}':voice=slt"]
+        audio_filter = ["-af", f"aloop=loop=-1:size=2e9,atrim=0:{duration}"]
+    else:
+        audio_input = ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:duration={duration}"]
+        audio_filter = []
+    command = [
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=duration={duration}:size={size}:rate={rate}",
+        *audio_input,
+        *audio_filter,
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest",
+        output_path
+    ]
+    subprocess.run(command, check=True)
+    return output_path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its waited-for children, in MB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": own / 1024, "children": children / 1024}
+
+
+def run_benchmark(duration=60, latency_ms=200, runs=1, audio="tts", max_workers=4, audio_file=None):
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("ffmpeg is required to synthesize the benchmark video")
+
+    stub = StubLLMServer(latency_ms=latency_ms).start()
+    client = andy.create_groq_client(base_url=stub.base_url)
+    work_dir = tempfile.mkdtemp(prefix="andy_benchmark_")
+    try:
+        video_path = synthesize_video(os.path.join(work_dir, "benchmark.mp4"), duration,
+                                      audio=audio, audio_file=audio_file)
+        audio_label = audio_file or audio
+        print(f"🎬 Synthesized {duration}s test video ({audio_label}) at {video_path}")
+
+        run_reports = []
+        for run in range(runs):
+            before = stub.snapshot()
+            coordinator = andy.ContentBasedVideoAnalysisCoordinator(client=client)
+            start = time.time()
+            try:
+                result = coordinator.analyze_video(video_path, max_workers=max_workers)
+            except ValueError as e:
+                # An empty transcript stops the pipeline before any agent stage runs
+                raise RuntimeError(f"Analysis failed before the agent stages ({e}); the '{audio_label}' "
+                                   "soundtrack produced no transcript, use speech audio") from e
+            wall_time = time.time() - start
+            after = stub.snapshot()
+
+            report = {
+                "run": run + 1,
+                "wall_time": wall_time,
+                "stage_timings": {name: timing["duration"] for name, timing in result["stage_timings"].items()},
+                "transcription_metrics": result.get("transcription_metrics", {}),
+                "llm_calls": after["calls"] - before["calls"],
+                "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+                "completion_tokens": after["completion_tokens"] - before["completion_tokens"],
+                "peak_rss_mb": peak_rss_mb()
+            }
+            run_reports.append(report)
+            print(f"⏱️ Run {run + 1}/{runs}: {wall_time:.2f}s, {report['llm_calls']} LLM calls, "
+                  f"{report['prompt_tokens']} prompt tokens")
+
+        wall_times = [r["wall_time"] for r in run_reports]
+        return {
+            "config": {
+                "duration": duration,
+                "audio": audio_label,
+                "latency_ms": latency_ms,
+                "runs": runs,
+                "max_workers": max_workers,
+                "whisper_model": andy.WHISPER_MODEL_SIZE,
+                "frame_extraction_mode": andy.FRAME_EXTRACTION_MODE,
+                "frame_selection_mode": andy.FRAME_SELECTION_MODE,
+                "transcript_extraction_mode": andy.TRANSCRIPT_EXTRACTION_MODE
+            },
+            "summary": {
+                "median_wall_time": statistics.median(wall_times),
+                "min_wall_time": min(wall_times),
+                "max_wall_time": max(wall_times),
+                "llm_calls_by_model": stub.snapshot()["calls_by_model"],
+                "peak_rss_mb": peak_rss_mb()
+            },
+            "runs": run_reports
+        }
+    finally:
+        stub.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the andy.py video analysis pipeline offline")
+    parser.add_argument("--duration", type=int, default=60, help="test video length in seconds")
+    parser.add_argument("--audio", choices=("tts", "tone"), default="tts",
+                        help="generated audio track; 'tone' has no speech, so no transcript for the agent stages")
+    parser.add_argument("--audio-file", help="speech recording to use as the soundtrack instead")
+    parser.add_argument("--latency-ms", type=int, default=200, help="stub LLM response latency")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        duration=args.duration,
+        latency_ms=args.latency_ms,
+        runs=args.runs,
+        audio=args.audio,
+        max_workers=args.max_workers,
+        audio_file=args.audio_file
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Report written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
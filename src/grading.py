@@ -5,10 +5,12 @@ from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
 from openai import OpenAI
+import httpx
 from datetime import datetime
 import json
 import time
 import logging
+import threading
 from typing import Dict, Any, Optional
 
 # Configure logging
@@ -44,20 +46,53 @@ CONFIG = {
         "multiple_choice": "llama3-70b-8192",
         "short_answer": "llama3-8b-8192",
         "essay": "llama3-70b-8192"
+    },
+    "HTTP_POOL": {
+        "max_connections": int(os.getenv("GROQ_MAX_CONNECTIONS", "32")),
+        "max_keepalive_connections": int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", "16")),
+        "keepalive_expiry": 60,
+        "connect_timeout": 10,
+        "read_timeout": 60
     }
 }
 
+def create_groq_client() -> OpenAI:
+    """Build a Groq client over a keep-alive HTTP connection pool shared by all agents"""
+    pool = CONFIG["HTTP_POOL"]
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool["max_connections"],
+            max_keepalive_connections=pool["max_keepalive_connections"],
+            keepalive_expiry=pool["keepalive_expiry"]
+        ),
+        timeout=httpx.Timeout(pool["read_timeout"], connect=pool["connect_timeout"])
+    )
+    return OpenAI(
+        api_key=os.getenv("GROQ_API_KEY"),
+        base_url="https://api.groq.com/openai/v1",
+        http_client=http_client
+    )
+
+# Created on first use so the module still imports without GROQ_API_KEY
+_groq_client: Optional[OpenAI] = None
+_groq_client_lock = threading.Lock()
+
+def get_groq_client() -> OpenAI:
+    """Return the shared Groq client, creating it on first use"""
+    global _groq_client
+    with _groq_client_lock:
+        if _groq_client is None:
+            _groq_client = create_groq_client()
+        return _groq_client
+
 class GradingAgent:
     """Base class for all grading agents with common functionality"""
     
-    def __init__(self, agent_type: str):
+    def __init__(self, agent_type: str, client: Optional[OpenAI] = None):
         self.agent_type = agent_type
         self.model_name = CONFIG["MODELS"][agent_type]
         self.max_tokens = CONFIG["MAX_TOKENS"][agent_type]
-        self.client = OpenAI(
-            api_key=os.getenv("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
-        )
+        self.client = client or get_groq_client()
     
     def _call_llm(self, prompt: str) -> str:
         """Make the LLM API call with retry logic"""
@@ -118,8 +153,8 @@ class GradingAgent:
 class MultipleChoiceGradingAgent(GradingAgent):
     """Agent for grading multiple choice questions"""
     
-    def __init__(self):
-        super().__init__("multiple_choice")
+    def __init__(self, client: Optional[OpenAI] = None):
+        super().__init__("multiple_choice", client)
     
     def grade(self, submission: Dict[str, Any], question_data: Dict[str, Any]) -> Dict[str, Any]:
         """Grade a multiple choice submission"""
@@ -155,8 +190,8 @@ Return a JSON object with these exact fields, without any markdown, code fences
 class ShortAnswerGradingAgent(GradingAgent):
     """Agent for grading short answer questions"""
     
-    def __init__(self):
-        super().__init__("short_answer")
+    def __init__(self, client: Optional[OpenAI] = None):
+        super().__init__("short_answer", client)
     
     def grade(self, submission: Dict[str, Any], question_data: Dict[str, Any]) -> Dict[str, Any]:
         """Grade a short answer submission"""
@@ -182,11 +217,12 @@ Return a JSON object with these exact fields, without any markdown, code fences
 class GradingCoordinator:
     """Orchestrates the grading process"""
     
-    def __init__(self):
+    def __init__(self, client: Optional[OpenAI] = None):
+        client = client or get_groq_client()
         self.agents = {
-            "multiple_choice": MultipleChoiceGradingAgent(),
-            "short_answer": ShortAnswerGradingAgent(),
-            "essay": ShortAnswerGradingAgent()  # Using same agent for simplicity
+            "multiple_choice": MultipleChoiceGradingAgent(client),
+            "short_answer": ShortAnswerGradingAgent(client),
+            "essay": ShortAnswerGradingAgent(client)  # Using same agent for simplicity
         }
     
     def grade_submission(self, submission_id: str) -> Dict[str, Any]:
@@ -14,10 +14,13 @@ import logging
 import base64
 from dotenv import load_dotenv
 import mediapipe as mp
-import whisper
 import threading
 import queue
 import asyncio
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from whisper_backends import WHISPER_BACKEND, WHISPER_MODEL_SIZE, create_whisper_backend
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -54,19 +57,135 @@ except Exception as e:
     logger.error(f"AI client initialization failed: {str(e)}")
     raise
 
-# YOLOv5 setup (pre-trained)
-yolo_model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
-yolo_model.eval()
-logger.info("✅ YOLOv5 loaded")
+# YOLOv5 setup: "torch" loads yolov5s through torch.hub (network on first run),
+# "onnx" runs an exported model from a local file with ONNX Runtime on CPU.
+# Export one with `python proctor_export_onnx.py [path]`.
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "torch")
+DETECTOR_ONNX_PATH = os.getenv("DETECTOR_ONNX_PATH", "models/yolov5s.onnx")
+DETECTOR_INPUT_SIZE = int(os.getenv("DETECTOR_INPUT_SIZE", "640"))
+DETECTOR_CONF_THRESHOLD = 0.25  # matches the YOLOv5 AutoShape defaults
+DETECTOR_IOU_THRESHOLD = 0.45
+DETECTOR_MAX_DETECTIONS = 300
+
+# COCO class names in YOLOv5 order, so both engines report the same labels
+# that PROCTOR_RULES["forbidden_objects"] is matched against
+COCO_CLASSES = [
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat",
+    "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack",
+    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball",
+    "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket",
+    "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair",
+    "couch", "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse",
+    "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink",
+    "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier",
+    "toothbrush"
+]
+
+class TorchYoloDetector:
+    """YOLOv5s through torch.hub AutoShape."""
+    def __init__(self):
+        self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
+        self.model.eval()
+        self.names = self.model.names
+
+    def __call__(self, images):
+        """Detect on a list of RGB frames; returns one (N, 6) xyxy/conf/class array per frame"""
+        results = self.model(images)
+        return [detections.cpu().numpy() for detections in results.xyxy]
+
+class OnnxYoloDetector:
+    """Exported YOLOv5 model on ONNX Runtime's CPU provider, with YOLOv5-style letterboxing and NMS."""
+    def __init__(self, model_path, input_size=DETECTOR_INPUT_SIZE):
+        import onnxruntime as ort
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX detector model not found: {model_path}")
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported without a dynamic batch axis only take one frame per run
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        if isinstance(model_input.shape[2], int):
+            input_size = model_input.shape[2]
+        self.input_size = input_size
+        self.names = self._load_names()
+
+    def _load_names(self):
+        # Ultralytics' export.py stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            import ast
+            names = ast.literal_eval(metadata["names"])
+            return [names[i] for i in sorted(names)] if isinstance(names, dict) else list(names)
+        return COCO_CLASSES
+
+    def _letterbox(self, image):
+        """Resize keeping aspect ratio and pad to a square input with YOLOv5's grey (114)"""
+        height, width = image.shape[:2]
+        ratio = min(self.input_size / height, self.input_size / width)
+        new_width, new_height = round(width * ratio), round(height * ratio)
+        pad_x = (self.input_size - new_width) / 2
+        pad_y = (self.input_size - new_height) / 2
+        if (new_width, new_height) != (width, height):
+            image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        top, bottom = round(pad_y - 0.1), round(pad_y + 0.1)
+        left, right = round(pad_x - 0.1), round(pad_x + 0.1)
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        tensor = image.transpose(2, 0, 1).astype(np.float32) / 255.0
+        return tensor, ratio, (left, top)
+
+    def _postprocess(self, prediction, ratio, padding, shape):
+        """Confidence filter, class-aware NMS and mapping back to original pixel coordinates"""
+        scores = prediction[:, 5:] * prediction[:, 4:5]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences > DETECTOR_CONF_THRESHOLD
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+        boxes, confidences, class_ids = prediction[keep, :4], confidences[keep], class_ids[keep]
+
+        # Offset boxes per class so one NMS call never suppresses across classes
+        offsets = class_ids[:, None] * 4096.0
+        nms_boxes = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2 + offsets, boxes[:, 2:]], axis=1)
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(),
+                                   DETECTOR_CONF_THRESHOLD, DETECTOR_IOU_THRESHOLD)
+        indices = np.array(indices, dtype=int).reshape(-1)[:DETECTOR_MAX_DETECTIONS]
+
+        xyxy = np.concatenate([boxes[indices, :2] - boxes[indices, 2:] / 2,
+                               boxes[indices, :2] + boxes[indices, 2:] / 2], axis=1)
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - padding[0]) / ratio).clip(0, shape[1])
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - padding[1]) / ratio).clip(0, shape[0])
+        return np.concatenate([xyxy, confidences[indices, None], class_ids[indices, None]], axis=1).astype(np.float32)
+
+    def __call__(self, images):
+        """Detect on a list of RGB frames; returns one (N, 6) xyxy/conf/class array per frame"""
+        prepared = [self._letterbox(image) for image in images]
+        batch = np.stack([tensor for tensor, _, _ in prepared])
+        if self.dynamic_batch:
+            predictions = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            predictions = np.concatenate([self.session.run(None, {self.input_name: tensor[None]})[0]
+                                          for tensor in batch])
+        return [self._postprocess(prediction, ratio, padding, image.shape)
+                for prediction, (_, ratio, padding), image in zip(predictions, prepared, images)]
+
+if DETECTOR_BACKEND == "onnx":
+    yolo_model = OnnxYoloDetector(DETECTOR_ONNX_PATH)
+elif DETECTOR_BACKEND == "torch":
+    yolo_model = TorchYoloDetector()
+else:
+    raise ValueError(f"Unsupported DETECTOR_BACKEND: {DETECTOR_BACKEND}")
+logger.info(f"✅ YOLOv5 loaded ({DETECTOR_BACKEND})")
 
 # MediaPipe setup
 mp_face_mesh = mp.solutions.face_mesh
 face_mesh = mp_face_mesh.FaceMesh(max_num_faces=2, refine_landmarks=True)
 logger.info("✅ MediaPipe FaceMesh loaded")
 
-# Whisper setup
-whisper_model = whisper.load_model("tiny")
-logger.info("✅ Whisper-tiny loaded")
+# Whisper setup: same backends and WHISPER_* settings as the analysis service
+whisper_model = create_whisper_backend(WHISPER_MODEL_SIZE, WHISPER_BACKEND)
+logger.info(f"✅ Whisper-{WHISPER_MODEL_SIZE} loaded ({WHISPER_BACKEND})")
 
 # Proctoring rules
 PROCTOR_RULES = {
@@ -77,9 +196,38 @@ PROCTOR_RULES = {
     "max_focus_lost_ms": 1000
 }
 
-# Event queue for batching
+# Event queue for batching; only events the local rules cannot decide go here
 event_queue = queue.Queue()
-gaze_off_tracker = {}  # Track gaze-off duration per session
+
+# Local rule engine: repeat alerts of the same kind are suppressed for the
+# cooldown, and a gaze-off or focus-loss episode ends after a gap without events
+RULE_ALERT_COOLDOWN = float(os.getenv("RULE_ALERT_COOLDOWN", "5"))
+RULE_EPISODE_GAP = float(os.getenv("RULE_EPISODE_GAP", "1.5"))
+
+# Session state cache: sessions started or ended here are authoritative;
+# sessions first seen from another instance are re-read after the TTL
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+
+# Inference pipeline configuration. Frames from all sessions are micro-batched
+# into one YOLOv5 forward pass; a batch can only fill up to the number of
+# workers waiting on it, so keep PROCTOR_WORKERS >= YOLO_MAX_BATCH_SIZE.
+PROCTOR_WORKERS = int(os.getenv("PROCTOR_WORKERS", "8"))
+PROCTOR_IDLE_TIMEOUT = float(os.getenv("PROCTOR_IDLE_TIMEOUT", "300"))  # seconds before an idle session's state is dropped
+YOLO_MAX_BATCH_SIZE = int(os.getenv("YOLO_MAX_BATCH_SIZE", "8"))
+YOLO_MAX_WAIT_MS = float(os.getenv("YOLO_MAX_WAIT_MS", "5"))
+YOLO_THROUGHPUT_WINDOW = 10  # seconds of history behind the frames/sec figure
+
+# Change gating: frames whose grayscale thumbnail barely differs from the last
+# fully analysed frame reuse its result, for at most MOTION_MAX_STALENESS seconds
+MOTION_GATING = os.getenv("MOTION_GATING", "true").lower() == "true"
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "4.0"))  # mean abs diff, 0-255 scale
+MOTION_MAX_STALENESS = float(os.getenv("MOTION_MAX_STALENESS", "2.0"))
+MOTION_THUMB_SIZE = (64, 48)
+
+# MediaPipe graphs and the shared Whisper model are not safe to call from
+# several worker threads at once
+face_mesh_lock = threading.Lock()
+whisper_lock = threading.Lock()
 
 # Helper functions
 def convert_firebase_types(data):
@@ -94,14 +242,90 @@ def convert_firebase_types(data):
         return datetime.fromtimestamp(data.seconds + data.nanoseconds / 1e9).isoformat()
     return data
 
+class YoloBatchServer:
+    """Gathers frames from every session and runs them through YOLOv5 in one batched call.
+
+    A batch is flushed once it holds max_batch_size frames or max_wait_ms has
+    passed since its first frame arrived.
+    """
+    def __init__(self, model, max_batch_size=YOLO_MAX_BATCH_SIZE, max_wait_ms=YOLO_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.forward_time = 0.0
+        self.history = deque()  # (finished_at, batch_size) within the throughput window
+        self.thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+        self.thread.start()
+
+    def detect(self, img_rgb):
+        """Queue one RGB frame and block until its detections (N x 6 xyxy array) are ready"""
+        future = Future()
+        self.requests.put((img_rgb, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.time()
+            try:
+                detections = self.model([img for img, _ in batch])
+                for (_, future), frame_detections in zip(batch, detections):
+                    future.set_result(frame_detections)
+            except Exception as e:
+                logger.error(f"YOLO batch inference error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finished = time.time()
+            with self.lock:
+                self.frames += len(batch)
+                self.batches += 1
+                self.forward_time += finished - start
+                self.history.append((finished, len(batch)))
+                while self.history and self.history[0][0] < finished - YOLO_THROUGHPUT_WINDOW:
+                    self.history.popleft()
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            recent = sum(size for finished, size in self.history if finished >= now - YOLO_THROUGHPUT_WINDOW)
+            return {
+                "frames": self.frames,
+                "batches": self.batches,
+                "avg_batch_size": self.frames / self.batches if self.batches else 0,
+                "avg_forward_ms": self.forward_time / self.batches * 1000 if self.batches else 0,
+                "frames_per_sec": recent / YOLO_THROUGHPUT_WINDOW,
+                "pending": self.requests.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000
+            }
+
+yolo_batcher = YoloBatchServer(yolo_model)
+
 def process_frame(frame):
     """Process video frame with YOLOv5 and MediaPipe."""
     results = {"faces": 0, "objects": [], "gaze_off": False}
 
     # YOLOv5 detection
     img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    yolo_results = yolo_model(img_rgb)
-    detections = yolo_results.xyxy[0].cpu().numpy()
+    detections = yolo_batcher.detect(img_rgb)
 
     for det in detections:
         class_id = int(det[5])
@@ -112,7 +336,8 @@ def process_frame(frame):
             results["objects"].append(class_name)
 
     # MediaPipe gaze tracking
-    face_results = face_mesh.process(img_rgb)
+    with face_mesh_lock:
+        face_results = face_mesh.process(img_rgb)
     if face_results.multi_face_landmarks:
         for landmarks in face_results.multi_face_landmarks:
             left_iris = landmarks.landmark[468]  # Left iris
@@ -125,7 +350,8 @@ def process_frame(frame):
 def process_audio(audio_data):
     """Transcribe audio and detect unauthorized speech."""
     try:
-        result = whisper_model.transcribe(audio_data, fp16=False)
+        with whisper_lock:
+            result = whisper_model.transcribe(audio_data, fp16=False)
         text = result["text"]
         volume = np.max(np.abs(audio_data))  # Mock volume analysis
         if volume > PROCTOR_RULES["max_background_speech_db"] and text.strip():
@@ -135,14 +361,412 @@ def process_audio(audio_data):
         logger.error(f"Audio processing error: {e}")
         return {"speech": "", "unauthorized": False}
 
+class SessionRegistry:
+    """In-process cache of proctoring session status, so frames skip Firestore reads."""
+    def __init__(self, ttl=SESSION_CACHE_TTL):
+        self.ttl = ttl
+        self.sessions = {}  # session_id -> (status, expires_at or None)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, session_id, status="active"):
+        """Record a session this instance started; it never expires until ended"""
+        with self.lock:
+            self.sessions[session_id] = (status, None)
+
+    def end(self, session_id):
+        """Keep the ended status for one TTL so late frames are rejected without a read"""
+        with self.lock:
+            self.sessions[session_id] = ("completed", time.time() + self.ttl)
+
+    def is_active(self, session_id):
+        now = time.time()
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry and (entry[1] is None or entry[1] > now):
+                self.hits += 1
+                return entry[0] == "active"
+            self.misses += 1
+
+        # Unknown or stale: fall back to Firestore and cache the answer, including
+        # misses, so a bad session id cannot force a read per frame either
+        session_doc = db.collection("proctor_sessions").document(session_id).get()
+        status = session_doc.to_dict().get("status") if session_doc.exists else None
+        now = time.time()
+        with self.lock:
+            # Expired entries are only dropped on this slow path
+            for expired in [key for key, (_, expires_at) in self.sessions.items()
+                            if expires_at is not None and expires_at <= now]:
+                del self.sessions[expired]
+            entry = self.sessions.get(session_id)
+            if entry is None or entry[1] is not None:
+                self.sessions[session_id] = (status, now + self.ttl)
+        return status == "active"
+
+    def stats(self):
+        with self.lock:
+            return {"sessions": len(self.sessions), "hits": self.hits, "misses": self.misses}
+
+session_registry = SessionRegistry()
+
+class FrameChangeGate:
+    """Per-session static-scene detector in front of the YOLOv5/FaceMesh pass.
+
+    Frames are compared with the thumbnail of the last fully analysed frame
+    rather than the previous frame, so slow drift still triggers detection.
+    """
+    def __init__(self, threshold=MOTION_THRESHOLD, max_staleness=MOTION_MAX_STALENESS):
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.reference = None
+        self.result = None
+        self.result_at = 0.0
+        self.detections = 0
+        self.reused = 0
+
+    def analyze(self, frame):
+        """Return the detection result for a BGR frame, reusing the last one if the scene is static"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+        now = time.time()
+        if self.reference is not None and now - self.result_at < self.max_staleness:
+            if np.mean(np.abs(thumb - self.reference)) < self.threshold:
+                self.reused += 1
+                return self.result
+
+        self.result = process_frame(frame)
+        self.reference = thumb
+        self.result_at = now
+        self.detections += 1
+        return self.result
+
+class SessionIngestBuffer:
+    """Latest-wins slots for one session's newest frame and audio window.
+
+    Anything still waiting when a newer item arrives is dropped and counted.
+    At most one worker task per session is scheduled at a time, and each task
+    handles a single pass so busy sessions take turns on the pool.
+    """
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.sid = None
+        self.last_seen = time.time()
+        self.frame = None  # (base64 frame, received_at)
+        self.audio = None  # (base64 audio, received_at)
+        self.scheduled = False
+        # Only the one worker draining this buffer touches the gate
+        self.gate = FrameChangeGate() if MOTION_GATING else None
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.audio_received = 0
+        self.audio_dropped = 0
+        self.audio_processed = 0
+        self.last_latency_ms = None
+        self.avg_latency_ms = None
+        self.max_latency_ms = 0.0
+
+    def offer(self, frame_data, audio_data, received_at, sid=None):
+        """Store new data; returns True if the caller must schedule a worker task"""
+        with self.lock:
+            self.sid = sid or self.sid
+            self.last_seen = received_at
+            if frame_data:
+                self.frames_received += 1
+                if self.frame is not None:
+                    self.frames_dropped += 1
+                self.frame = (frame_data, received_at)
+            if audio_data:
+                self.audio_received += 1
+                if self.audio is not None:
+                    self.audio_dropped += 1
+                self.audio = (audio_data, received_at)
+            if self.scheduled or (self.frame is None and self.audio is None):
+                return False
+            self.scheduled = True
+            return True
+
+    def take(self):
+        """Hand the newest frame and audio to a worker"""
+        with self.lock:
+            frame, audio = self.frame, self.audio
+            self.frame = None
+            self.audio = None
+            return frame, audio
+
+    def release(self):
+        """End a worker pass; returns True if new data arrived and the task must be resubmitted"""
+        with self.lock:
+            if self.frame is None and self.audio is None:
+                self.scheduled = False
+                return False
+            return True
+
+    def record_latency(self, received_at):
+        latency_ms = (time.time() - received_at) * 1000
+        with self.lock:
+            self.last_latency_ms = latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            # Exponential moving average keeps the figure current without history
+            if self.avg_latency_ms is None:
+                self.avg_latency_ms = latency_ms
+            else:
+                self.avg_latency_ms = 0.9 * self.avg_latency_ms + 0.1 * latency_ms
+
+    def stats(self):
+        with self.lock:
+            return {
+                "frames_received": self.frames_received,
+                "frames_processed": self.frames_processed,
+                "frames_dropped": self.frames_dropped,
+                "audio_received": self.audio_received,
+                "audio_processed": self.audio_processed,
+                "audio_dropped": self.audio_dropped,
+                "last_latency_ms": self.last_latency_ms,
+                "avg_latency_ms": self.avg_latency_ms,
+                "max_latency_ms": self.max_latency_ms,
+                "frames_detected": self.gate.detections if self.gate else self.frames_processed,
+                "frames_reused": self.gate.reused if self.gate else 0
+            }
+
+class ProctorPipeline:
+    """Runs frame and audio inference on a bounded worker pool, off the socket handlers."""
+    def __init__(self, workers=PROCTOR_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="proctor-worker")
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def _buffer(self, session_id):
+        with self.lock:
+            buffer = self.buffers.get(session_id)
+            if buffer is None:
+                self._evict_idle()
+                buffer = self.buffers[session_id] = SessionIngestBuffer(session_id)
+            return buffer
+
+    def _evict_idle(self):
+        """Drop buffers of sessions that stopped sending without ending (caller holds the lock)"""
+        cutoff = time.time() - PROCTOR_IDLE_TIMEOUT
+        for session_id in [sid for sid, buffer in self.buffers.items() if buffer.last_seen < cutoff]:
+            del self.buffers[session_id]
+
+    def ingest(self, session_id, frame_data, audio_data, sid=None):
+        buffer = self._buffer(session_id)
+        if buffer.offer(frame_data, audio_data, time.time(), sid):
+            self.executor.submit(self._drain, buffer)
+
+    def _drain(self, buffer):
+        """Process the newest data for a session once, then requeue behind other sessions if more arrived"""
+        frame, audio = buffer.take()
+        try:
+            if frame is not None:
+                handle_frame(buffer.session_id, frame[0], buffer.gate)
+                with buffer.lock:
+                    buffer.frames_processed += 1
+                buffer.record_latency(frame[1])
+            if audio is not None:
+                handle_audio(buffer.session_id, audio[0])
+                with buffer.lock:
+                    buffer.audio_processed += 1
+        except Exception as e:
+            logger.error(f"Proctor inference error for {buffer.session_id}: {e}")
+            if buffer.sid:
+                socketio.emit('error', {'message': str(e)}, to=buffer.sid)
+        finally:
+            if buffer.release():
+                self.executor.submit(self._drain, buffer)
+
+    def remove(self, session_id):
+        with self.lock:
+            self.buffers.pop(session_id, None)
+
+    def remove_client(self, sid):
+        """Drop the buffers fed by a disconnected socket; returns their session ids"""
+        with self.lock:
+            session_ids = [session_id for session_id, buffer in self.buffers.items() if buffer.sid == sid]
+            for session_id in session_ids:
+                del self.buffers[session_id]
+        return session_ids
+
+    def stats(self):
+        with self.lock:
+            buffers = list(self.buffers.values())
+        return {buffer.session_id: buffer.stats() for buffer in buffers}
+
+proctor_pipeline = ProctorPipeline()
+
+class LocalRuleEngine:
+    """Decides clear-cut proctoring events against PROCTOR_RULES without an LLM call.
+
+    Face counts and forbidden objects alert immediately. Gaze-off and focus-loss
+    events are folded into per-session episodes and alert once an episode
+    outlasts its limit. Anything else, such as speech content, is escalated.
+    """
+    def __init__(self, rules=PROCTOR_RULES, cooldown=RULE_ALERT_COOLDOWN, episode_gap=RULE_EPISODE_GAP):
+        self.rules = rules
+        self.cooldown = cooldown
+        self.episode_gap = episode_gap
+        self.lock = threading.Lock()
+        self.sessions = {}  # session_id -> {"episodes": {...}, "last_alert": {...}}
+        self.counts = {"alerts": 0, "ok": 0, "suppressed": 0, "escalated": 0}
+
+    def reset(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def _evict_idle(self, now):
+        """Drop state of sessions with no events for PROCTOR_IDLE_TIMEOUT (caller holds the lock)"""
+        cutoff = now - PROCTOR_IDLE_TIMEOUT
+        for session_id in [sid for sid, state in self.sessions.items() if state["last_seen"] < cutoff]:
+            del self.sessions[session_id]
+
+    def _episode(self, state, kind, now):
+        """Extend the running episode of this kind, or start a new one after a gap"""
+        episode = state["episodes"].get(kind)
+        if episode is None or now - episode["last_seen"] > self.episode_gap:
+            episode = state["episodes"][kind] = {"started": now, "last_seen": now, "alerted": False}
+        episode["last_seen"] = now
+        return episode
+
+    def _decide(self, event, state, now):
+        event_type = event.get("type")
+        if event_type == "face_count":
+            if event["value"] > self.rules["max_faces"]:
+                return "ALERT", f"{event['value']} faces detected", ("face_count",)
+            return "OK", "Face count within limit", None
+
+        if event_type == "object_detected":
+            forbidden = sorted(set(event["value"]) & set(self.rules["forbidden_objects"]))
+            if forbidden:
+                return "ALERT", f"Forbidden object detected: {', '.join(forbidden)}", ("object_detected", *forbidden)
+            return "OK", "No forbidden objects", None
+
+        if event_type in ("gaze_off", "focus_lost"):
+            episode = self._episode(state, event_type, now)
+            duration = episode["last_seen"] - episode["started"]
+            if event_type == "gaze_off":
+                exceeded = duration > self.rules["max_gaze_off_seconds"]
+                reason = f"Prolonged gaze off-screen ({duration:.1f}s)"
+            else:
+                exceeded = duration * 1000 > self.rules["max_focus_lost_ms"]
+                reason = f"Exam window lost focus ({duration * 1000:.0f}ms)"
+            if exceeded and not episode["alerted"]:
+                episode["alerted"] = True
+                event.update({"type": f"{event_type}_extended", "value": round(duration, 3)})
+                return "ALERT", reason, None
+            return "OK", "Within allowed duration", None
+
+        return "ESCALATE", "Needs AI review", None
+
+    def evaluate(self, event, now=None):
+        """Return {'event', 'status', 'reason'} with status ALERT, OK or ESCALATE"""
+        now = time.time() if now is None else now
+        event = dict(event)
+        with self.lock:
+            state = self.sessions.get(event.get("session_id"))
+            if state is None:
+                self._evict_idle(now)
+                state = self.sessions[event.get("session_id")] = {"episodes": {}, "last_alert": {}}
+            state["last_seen"] = now
+            status, reason, alert_key = self._decide(event, state, now)
+            if status == "ALERT" and alert_key is not None:
+                if now - state["last_alert"].get(alert_key, float("-inf")) < self.cooldown:
+                    status, reason = "OK", "Repeat alert within cooldown"
+                    self.counts["suppressed"] += 1
+                else:
+                    state["last_alert"][alert_key] = now
+            self.counts[{"ALERT": "alerts", "OK": "ok", "ESCALATE": "escalated"}[status]] += 1
+        return {"event": event, "status": status, "reason": reason}
+
+    def stats(self):
+        with self.lock:
+            return {"sessions": len(self.sessions), **self.counts}
+
+rule_engine = LocalRuleEngine()
+alert_log_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="proctor-alert-log")
+
+def log_alert(result):
+    """Persist an alert to Firestore."""
+    try:
+        db.collection("proctor_logs").add({
+            "session_id": result["event"].get("session_id", "unknown"),
+            "timestamp": datetime.now(),
+            "event": convert_firebase_types(result["event"]),
+            "status": result["status"],
+            "reason": result["reason"]
+        })
+    except Exception as e:
+        logger.error(f"Alert logging error: {e}")
+
+def raise_alert(result):
+    """Broadcast an alert right away and log it to Firestore off the calling thread."""
+    socketio.emit('proctor_alert', result, broadcast=True)
+    alert_log_executor.submit(log_alert, result)
+
+def submit_event(event):
+    """Decide an event locally, escalating only ambiguous ones to the AI batch."""
+    # Frames still in flight when a session ends must not recreate its rule state
+    if not session_registry.is_active(event["session_id"]):
+        return
+    result = rule_engine.evaluate(event)
+    if result["status"] == "ALERT":
+        raise_alert(result)
+    elif result["status"] == "ESCALATE":
+        event_queue.put(event)
+
+def handle_frame(session_id, frame_data, gate=None):
+    """Decode a base64 frame, run detection and queue any resulting events."""
+    frame_bytes = base64.b64decode(frame_data)
+    frame_np = np.frombuffer(frame_bytes, dtype=np.uint8)
+    frame = cv2.imdecode(frame_np, cv2.IMREAD_COLOR)
+    vision_results = gate.analyze(frame) if gate else process_frame(frame)
+    
+    if vision_results["faces"] > PROCTOR_RULES["max_faces"]:
+        submit_event({
+            "type": "face_count",
+            "value": vision_results["faces"],
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        })
+    if vision_results["objects"]:
+        submit_event({
+            "type": "object_detected",
+            "value": vision_results["objects"],
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        })
+    if vision_results["gaze_off"]:
+        submit_event({
+            "type": "gaze_off",
+            "value": True,
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        })
+
+def handle_audio(session_id, audio_data):
+    """Decode a base64 PCM window, transcribe it and queue unauthorized speech."""
+    audio_bytes = base64.b64decode(audio_data)
+    audio_np = np.frombuffer(audio_bytes, dtype=np.float32)
+    audio_results = process_audio(audio_np)
+    if audio_results["unauthorized"]:
+        submit_event({
+            "type": "unauthorized_speech",
+            "value": audio_results["speech"],
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        })
+
 async def evaluate_events(events):
-    """Use Groq Llama to evaluate proctoring events."""
+    """Use Groq Llama to evaluate proctoring events the local rules escalated."""
     if not ai_client or not events:
-        return [{"event": e, "status": "OK", "reason": "No AI client or events"}] * len(events)
+        return [{"event": e, "status": "OK", "reason": "No AI client or events"} for e in events]
 
     prompt = f"""
     You are an AI proctor. Review these events and determine if they indicate cheating.
-    Return a JSON array of objects with 'event', 'status' ('OK' or 'ALERT'), and 'reason'.
+    Return a JSON array of objects with 'event', 'status' ('OK' or 'ALERT'), and 'reason',
+    one per event and in the same order.
     Rules: {json.dumps(PROCTOR_RULES)}
     
     EVENTS:
@@ -151,27 +775,33 @@ async def evaluate_events(events):
     Example output:
     [
         {{
-            "event": {{ "type": "face_count", "value": 2 }},
+            "event": {{ "type": "unauthorized_speech", "value": "what is the answer to question 3" }},
             "status": "ALERT",
-            "reason": "Multiple faces detected"
+            "reason": "Candidate appears to be asking for answers"
         }}
     ]
     """
 
     try:
-        response = await ai_client.chat.completions.create(
+        # The Groq client is synchronous; keep it off the event loop
+        response = await asyncio.to_thread(
+            ai_client.chat.completions.create,
             model="llama3-8b-8192",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=500
         )
-        result = json.loads(response.choices[0].message.content)
-        return result
+        results = json.loads(response.choices[0].message.content)
+        # Keep the original events so session ids survive the round trip
+        if len(results) == len(events):
+            for result, event in zip(results, events):
+                result["event"] = event
+        return results
     except Exception as e:
         logger.error(f"Groq API error: {e}")
-        return [{"event": e, "status": "OK", "reason": "AI evaluation failed"}] * len(events)
+        return [{"event": event, "status": "OK", "reason": "AI evaluation failed"} for event in events]
 
 def process_event_batch():
-    """Process batched events every 2 seconds."""
+    """Send escalated events to the AI in batches every 2 seconds."""
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     
@@ -191,28 +821,8 @@ def process_event_batch():
                 # Run async evaluation
                 results = loop.run_until_complete(evaluate_events(events))
                 for result in results:
-                    if result["status"] == "ALERT":
-                        socketio.emit('proctor_alert', result, broadcast=True)
-                        # Log to Firebase
-                        db.collection("proctor_logs").add({
-                            "session_id": result["event"].get("session_id", "unknown"),
-                            "timestamp": datetime.now(),
-                            "event": convert_firebase_types(result["event"]),
-                            "status": result["status"],
-                            "reason": result["reason"]
-                        })
-                        # Update gaze-off tracker
-                        session_id = result["event"].get("session_id")
-                        if result["event"]["type"] == "gaze_off" and result["event"]["value"]:
-                            gaze_off_tracker[session_id] = gaze_off_tracker.get(session_id, 0) + 2
-                            if gaze_off_tracker[session_id] > PROCTOR_RULES["max_gaze_off_seconds"]:
-                                socketio.emit('proctor_alert', {
-                                    "event": {"type": "gaze_off_extended", "value": gaze_off_tracker[session_id]},
-                                    "status": "ALERT",
-                                    "reason": "Prolonged gaze off-screen"
-                                }, broadcast=True)
-                        elif result["event"]["type"] != "gaze_off":
-                            gaze_off_tracker[session_id] = 0
+                    if result.get("status") == "ALERT":
+                        raise_alert(result)
         except Exception as e:
             logger.error(f"Event batch processing error: {e}")
         socketio.sleep(0.1)
@@ -226,6 +836,12 @@ def handle_connect():
     logger.info("Client connected")
     emit('connected', {'status': 'OK'})
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    # A reconnecting client gets a fresh buffer with its next frame
+    proctor_pipeline.remove_client(request.sid)
+    logger.info("Client disconnected")
+
 @socketio.on('proctor_data')
 def handle_proctor_data(data):
     """Handle incoming proctoring data from client."""
@@ -236,56 +852,18 @@ def handle_proctor_data(data):
         focus_status = data.get('focus', True)
 
         # Validate session
-        session_doc = db.collection("proctor_sessions").document(session_id).get()
-        if not session_doc.exists or session_doc.to_dict().get("status") != "active":
+        if not session_id or not session_registry.is_active(session_id):
             emit('error', {'message': 'Invalid or inactive session'})
             return
 
-        # Process frame
-        if frame_data:
-            frame_bytes = base64.b64decode(frame_data)
-            frame_np = np.frombuffer(frame_bytes, dtype=np.uint8)
-            frame = cv2.imdecode(frame_np, cv2.IMREAD_COLOR)
-            vision_results = process_frame(frame)
-            
-            if vision_results["faces"] > PROCTOR_RULES["max_faces"]:
-                event_queue.put({
-                    "type": "face_count",
-                    "value": vision_results["faces"],
-                    "session_id": session_id,
-                    "timestamp": datetime.now().isoformat()
-                })
-            if vision_results["objects"]:
-                event_queue.put({
-                    "type": "object_detected",
-                    "value": vision_results["objects"],
-                    "session_id": session_id,
-                    "timestamp": datetime.now().isoformat()
-                })
-            if vision_results["gaze_off"]:
-                event_queue.put({
-                    "type": "gaze_off",
-                    "value": True,
-                    "session_id": session_id,
-                    "timestamp": datetime.now().isoformat()
-                })
-
-        # Process audio (placeholder: expects PCM data)
-        if audio_data:
-            audio_bytes = base64.b64decode(audio_data)
-            audio_np = np.frombuffer(audio_bytes, dtype=np.float32)
-            audio_results = process_audio(audio_np)
-            if audio_results["unauthorized"]:
-                event_queue.put({
-                    "type": "unauthorized_speech",
-                    "value": audio_results["speech"],
-                    "session_id": session_id,
-                    "timestamp": datetime.now().isoformat()
-                })
+        # Frame and audio inference runs on the pipeline workers; only the
+        # newest frame and audio window per session are kept
+        if frame_data or audio_data:
+            proctor_pipeline.ingest(session_id, frame_data, audio_data, request.sid)
 
         # Process focus
         if not focus_status:
-            event_queue.put({
+            submit_event({
                 "type": "focus_lost",
                 "value": True,
                 "session_id": session_id,
@@ -316,7 +894,8 @@ def start_session():
             "alerts": []
         })
         session_id = session_ref[1].id
-        gaze_off_tracker[session_id] = 0
+        session_registry.register(session_id)
+        rule_engine.reset(session_id)
         return jsonify({"session_id": session_id, "status": "started"})
     except Exception as e:
         logger.error(f"Start session error: {e}")
@@ -336,8 +915,9 @@ def end_session():
             "end_time": datetime.now(),
             "status": "completed"
         })
-        if session_id in gaze_off_tracker:
-            del gaze_off_tracker[session_id]
+        session_registry.end(session_id)
+        rule_engine.reset(session_id)
+        proctor_pipeline.remove(session_id)
         return jsonify({"status": "ended"})
     except Exception as e:
         logger.error(f"End session error: {e}")
@@ -365,5 +945,26 @@ def session_status():
         logger.error(f"Session status error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/pipeline_stats', methods=['GET'])
+def pipeline_stats():
+    """Per-session frame/audio drop counts and end-to-end frame latency."""
+    session_id = request.args.get('session_id')
+    stats = proctor_pipeline.stats()
+    if session_id:
+        if session_id not in stats:
+            return jsonify({"error": "Session not found"}), 404
+        return jsonify({session_id: stats[session_id]})
+    return jsonify(stats)
+
+@app.route('/api/rule_stats', methods=['GET'])
+def rule_stats():
+    """How many events the local rules decided versus escalated to the AI."""
+    return jsonify(rule_engine.stats())
+
+@app.route('/api/inference_stats', methods=['GET'])
+def inference_stats():
+    """Batched YOLOv5 throughput across all sessions."""
+    return jsonify(yolo_batcher.stats())
+
 if __name__ == '__main__':
     socketio.run(app, debug=True, port=5011)
\ No newline at end of file
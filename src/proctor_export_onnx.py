@@ -0,0 +1,51 @@
+"""Export the proctoring object detector to ONNX for DETECTOR_BACKEND=onnx.
+
+Kept separate from proctor.py, which loads its detector, FaceMesh, Whisper and
+the Groq client at import, so the export works before any ONNX model exists.
+Needs the network once to fetch yolov5s through torch.hub:
+
+    python proctor_export_onnx.py [output_path]
+"""
+import logging
+import os
+import sys
+
+import torch
+from dotenv import load_dotenv
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('proctor_export_onnx')
+
+load_dotenv()
+
+# Same settings proctor.py reads when loading the exported model
+DETECTOR_ONNX_PATH = os.getenv("DETECTOR_ONNX_PATH", "models/yolov5s.onnx")
+DETECTOR_INPUT_SIZE = int(os.getenv("DETECTOR_INPUT_SIZE", "640"))
+
+
+def export_onnx_model(output_path=DETECTOR_ONNX_PATH, input_size=DETECTOR_INPUT_SIZE):
+    """Export the torch.hub yolov5s weights to ONNX with a dynamic batch axis."""
+    model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True, autoshape=False)
+    model.eval()
+    for module in model.modules():
+        # Make the Detect head return only the concatenated predictions
+        if module.__class__.__name__ == "Detect":
+            module.inplace = False
+            module.export = True
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 3, input_size, input_size),
+        output_path,
+        opset_version=12,
+        input_names=["images"],
+        output_names=["output0"],
+        dynamic_axes={"images": {0: "batch"}, "output0": {0: "batch"}}
+    )
+    logger.info(f"✅ Exported YOLOv5s to {output_path}")
+    return output_path
+
+
+if __name__ == '__main__':
+    export_onnx_model(sys.argv[1] if len(sys.argv) > 1 else DETECTOR_ONNX_PATH)
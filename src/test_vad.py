@@ -0,0 +1,40 @@
+import numpy as np
+
+from vad import detect_speech_regions
+
+
+SAMPLE_RATE = 16000
+
+
+def _seconds(regions):
+    return sum(end - start for start, end in regions) / SAMPLE_RATE
+
+
+def test_continuous_tone_is_kept():
+    t = np.arange(30 * SAMPLE_RATE) / SAMPLE_RATE
+    audio = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    assert detect_speech_regions(audio, SAMPLE_RATE) == [(0, len(audio))]
+
+
+def test_continuous_noisy_speech_is_kept():
+    rng = np.random.default_rng(0)
+    t = np.arange(30 * SAMPLE_RATE) / SAMPLE_RATE
+    # Syllable-rate amplitude modulation over steady background noise, no pauses
+    envelope = 0.1 * (1 + 0.8 * np.sin(2 * np.pi * 4 * t)) + 0.02
+    audio = (envelope * rng.standard_normal(len(t))).astype(np.float32)
+    assert _seconds(detect_speech_regions(audio, SAMPLE_RATE)) > 29
+
+
+def test_pauses_are_trimmed():
+    rng = np.random.default_rng(0)
+    speech = 0.2 * rng.standard_normal(5 * SAMPLE_RATE)
+    silence = 0.0005 * rng.standard_normal(5 * SAMPLE_RATE)
+    audio = np.concatenate([speech, silence, speech, silence]).astype(np.float32)
+    regions = detect_speech_regions(audio, SAMPLE_RATE)
+    assert len(regions) == 2
+    assert 10 <= _seconds(regions) < 12
+
+
+def test_silence_falls_back_to_whole_buffer():
+    audio = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    assert detect_speech_regions(audio, SAMPLE_RATE) == [(0, len(audio))]
@@ -0,0 +1,60 @@
+"""Energy-based voice activity detection for chunked transcription.
+
+Kept free of the service modules' import-time setup (Firebase, Whisper) so it
+can be used and tested on its own.
+"""
+import os
+import numpy as np
+
+
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))  # absolute floor, dBFS
+VAD_NOISE_MARGIN_DB = 10  # speech must also be this far above the quietest 10% of frames...
+VAD_MIN_DYNAMIC_RANGE_DB = 20  # ...but only when the audio has real quiet stretches
+VAD_MIN_KEPT_FRACTION = 0.01  # below this the VAD is not trusted and all audio is kept
+VAD_MIN_SILENCE_SECONDS = 1.0
+VAD_PADDING_SECONDS = 0.3
+
+def detect_speech_regions(audio, sample_rate=16000):
+    """Energy-based VAD: return [(start_sample, end_sample)] regions containing sound.
+
+    The threshold is the absolute VAD_THRESHOLD_DB floor, raised to
+    VAD_NOISE_MARGIN_DB above the noise floor (10th percentile frame energy)
+    only when the 10th-90th percentile range shows VAD_MIN_DYNAMIC_RANGE_DB of
+    contrast. Continuous sound such as a lecture without pauses, steady
+    background noise or music therefore stays in. If the VAD keeps nothing or
+    almost nothing, the whole buffer is returned as one region.
+    """
+    if len(audio) == 0:
+        return []
+    whole = [(0, len(audio))]
+    frame_length = int(sample_rate * VAD_FRAME_MS / 1000)
+    frame_total = len(audio) // frame_length
+    if frame_total == 0:
+        return whole
+    
+    frames = audio[:frame_total * frame_length].reshape(frame_total, frame_length)
+    energy = np.einsum("ij,ij->i", frames, frames) / frame_length
+    energy_db = 10 * np.log10(energy + 1e-10)
+    noise_floor, loud = np.percentile(energy_db, [10, 90])
+    threshold = VAD_THRESHOLD_DB
+    if loud - noise_floor >= VAD_MIN_DYNAMIC_RANGE_DB:
+        threshold = max(threshold, float(noise_floor) + VAD_NOISE_MARGIN_DB)
+    
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (energy_db > threshold).astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    
+    min_gap = int(VAD_MIN_SILENCE_SECONDS * 1000 / VAD_FRAME_MS)
+    padding = int(VAD_PADDING_SECONDS * sample_rate)
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    regions = [(max(0, start * frame_length - padding), min(len(audio), end * frame_length + padding))
+               for start, end in regions]
+    
+    if sum(end - start for start, end in regions) < VAD_MIN_KEPT_FRACTION * len(audio):
+        return whole
+    return regions
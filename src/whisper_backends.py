@@ -0,0 +1,59 @@
+"""Whisper speech-to-text backends shared by the analysis and proctoring services.
+
+Kept free of the service modules' import-time setup (Firebase, Flask) so both
+can load the same backends; the model libraries are imported on first use.
+"""
+import os
+
+
+WHISPER_MODEL_SIZES = ("tiny", "base", "small")
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "tiny")
+# "openai" runs the reference PyTorch model in fp32; "ctranslate2" runs
+# faster-whisper with quantized weights (WHISPER_COMPUTE_TYPE, int8 by default).
+WHISPER_BACKENDS = ("openai", "ctranslate2")
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+
+class OpenAIWhisperBackend:
+    """Reference openai-whisper model"""
+    def __init__(self, model_size, cpu_threads=0):
+        import whisper
+        self.model = whisper.load_model(model_size)
+
+    def transcribe(self, audio, **kwargs):
+        return self.model.transcribe(audio, **kwargs)
+
+class CTranslate2WhisperBackend:
+    """faster-whisper (CTranslate2) model with quantized CPU inference.
+
+    Returns results in the openai-whisper shape: text plus segments carrying
+    optional word lists.
+    """
+    def __init__(self, model_size, cpu_threads=0, compute_type=WHISPER_COMPUTE_TYPE):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, audio, language=None, word_timestamps=False, fp16=None, **kwargs):
+        segments, info = self.model.transcribe(audio, language=language, word_timestamps=word_timestamps, **kwargs)
+        result_segments = []
+        for segment in segments:
+            result_segment = {"text": segment.text, "start": segment.start, "end": segment.end}
+            if word_timestamps and segment.words:
+                result_segment["words"] = [
+                    {"word": word.word, "start": word.start, "end": word.end} for word in segment.words
+                ]
+            result_segments.append(result_segment)
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments,
+            "language": info.language
+        }
+
+def create_whisper_backend(model_size=WHISPER_MODEL_SIZE, backend=WHISPER_BACKEND, cpu_threads=0):
+    if model_size not in WHISPER_MODEL_SIZES:
+        raise ValueError(f"Unsupported Whisper model size: {model_size} (expected one of {WHISPER_MODEL_SIZES})")
+    if backend not in WHISPER_BACKENDS:
+        raise ValueError(f"Unsupported Whisper backend: {backend} (expected one of {WHISPER_BACKENDS})")
+    if backend == "ctranslate2":
+        return CTranslate2WhisperBackend(model_size, cpu_threads)
+    return OpenAIWhisperBackend(model_size, cpu_threads)